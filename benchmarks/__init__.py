@@ -0,0 +1 @@
+"""Benchmarks for heppyplotlib, to be run with asv (airspeed velocity)."""
@@ -0,0 +1,68 @@
+"""Benchmark combining replica files into error bands."""
+
+from heppyplotlib import errorcalc, loader
+
+from . import synthetic
+
+OBSERVABLES = 20
+
+
+class Combine:
+    """Combine one data object of a number of replica files, where the first
+    file is the central one, or of a replica archive of these files. The
+    replica counts are odd, such that the variations come in pairs for the
+    asymmetric hessian error."""
+
+    params = (['standard_error', 'asymmetric_hessian_error', 'envelope_error'],
+              [11, 51], [10, 1000], ['batch', 'streaming', 'archive'])
+    param_names = ['error_calc', 'replicas', 'bins', 'mode']
+    timeout = 120
+
+    def setup(self, error_calc, replicas, nbins, mode):
+        if mode == 'archive':
+            self.files = synthetic.replica_archive(replicas, OBSERVABLES, nbins)
+        else:
+            self.files = synthetic.replica_files(replicas, OBSERVABLES, nbins)
+        self.rivet_path = synthetic.rivet_path(0)
+        self.error_calc = getattr(errorcalc, error_calc)
+        loader.set_cache_size(replicas + 1)
+        loader.invalidate()
+
+    def teardown(self, error_calc, replicas, nbins, mode):
+        loader.set_cache_size(32)
+
+    def time_combine(self, error_calc, replicas, nbins, mode):
+        self.combine(mode)
+
+    def peakmem_combine(self, error_calc, replicas, nbins, mode):
+        self.combine(mode)
+
+    def combine(self, mode):
+        loader.invalidate()
+        # measure the combination, not the conversion into YODA objects
+        errorcalc.combine(self.files, self.rivet_path, self.error_calc, rebin_count=1,
+                          streaming=mode == 'streaming', as_histogram=True)
+
+
+class CombineMany:
+    """Combine all data objects of a number of replica files."""
+
+    params = ([11, 51], [10, 1000])
+    param_names = ['replicas', 'bins']
+    timeout = 120
+
+    def setup(self, replicas, nbins):
+        self.files = synthetic.replica_files(replicas, OBSERVABLES, nbins)
+        self.rivet_paths = [synthetic.rivet_path(observable)
+                            for observable in range(OBSERVABLES)]
+        loader.invalidate()
+
+    def time_combine_many(self, replicas, nbins):
+        loader.invalidate()
+        errorcalc.combine_many(self.files, self.rivet_paths, errorcalc.standard_error,
+                               uses_rivet_plot_info=False, as_histogram=True)
+
+    def peakmem_combine_many(self, replicas, nbins):
+        loader.invalidate()
+        errorcalc.combine_many(self.files, self.rivet_paths, errorcalc.standard_error,
+                               uses_rivet_plot_info=False, as_histogram=True)
@@ -0,0 +1,43 @@
+"""Benchmark the start-up cost of heppyplotlib.
+
+Each timeraw benchmark runs in a fresh interpreter, such that the modules
+imported by earlier benchmarks are not reused."""
+
+import subprocess
+import sys
+
+# dependencies that must not be imported by a plain "import heppyplotlib"
+HEAVY_MODULES = ('matplotlib', 'numpy', 'yoda', 'rivet')
+
+_HEAVY_MODULES_SCRIPT = """
+import sys
+import heppyplotlib
+print(sum(1 for name in {!r} if name in sys.modules))
+""".format(HEAVY_MODULES)
+
+
+def timeraw_import_heppyplotlib():
+    return "import heppyplotlib"
+
+
+def timeraw_import_heppyplotlib_errorcalc():
+    return "import heppyplotlib.errorcalc"
+
+
+def timeraw_command_line_usage():
+    return """
+import subprocess
+import sys
+subprocess.call([sys.executable, '-m', 'heppyplotlib.command_line'],
+                stdout=subprocess.DEVNULL)
+"""
+
+
+def track_heavy_modules_imported():
+    """The number of heavy dependencies imported by "import heppyplotlib",
+    which should stay 0."""
+    output = subprocess.check_output([sys.executable, '-c', _HEAVY_MODULES_SCRIPT])
+    return int(output)
+
+
+track_heavy_modules_imported.unit = "modules"
@@ -0,0 +1,131 @@
+"""Benchmark loading data objects and resolving their arithmetic."""
+
+import importlib.util
+
+from heppyplotlib import loader, yodaplot, yodatext
+from heppyplotlib.histogram import Histogram
+
+from . import synthetic
+
+OBSERVABLES = 20
+
+# the resolve_data_object arguments of each operation, where REFERENCE is
+# replaced by the file name of a second replica
+REFERENCE = 'reference'
+OPERATIONS = {
+    'none': {},
+    'divide': {'divide_by': REFERENCE},
+    'multiply': {'multiply_by': REFERENCE},
+    'subtract': {'subtract_by': REFERENCE},
+    'deviate': {'deviate_from': REFERENCE},
+    'divide_correlated': {'divide_by': REFERENCE, 'assume_correlated': True},
+    'scale': {'divide_by': 2.0},
+    'rebin': {'rebin_count': 5},
+    'rebin_reference': {'rebin_count': 5, 'rebin_begin': 1},
+}
+
+# the operations that resolve the Scatter2D reference data below /REF instead
+# of the Histo1D, whose bin edges are only written with 6 digits
+REFERENCE_OPERATIONS = {'rebin_reference'}
+
+
+class ResolveDataObject:
+    """Resolve a data object from a file, with an empty (cold) or filled (warm)
+    loader cache."""
+
+    params = (sorted(OPERATIONS), [10, 1000], ['cold', 'warm'])
+    param_names = ['operation', 'bins', 'cache']
+
+    def setup(self, operation, nbins, cache):
+        self.files = synthetic.replica_files(2, OBSERVABLES, nbins)
+        self.rivet_path = synthetic.rivet_path(0)
+        if operation in REFERENCE_OPERATIONS:
+            self.rivet_path = '/REF' + self.rivet_path
+        self.kwargs = {key: self.files[1] if value == REFERENCE else value
+                       for key, value in OPERATIONS[operation].items()}
+        loader.invalidate()
+        if cache == 'warm':
+            self.resolve(cache)
+
+    def time_resolve_data_object(self, operation, nbins, cache):
+        self.resolve(cache)
+
+    def peakmem_resolve_data_object(self, operation, nbins, cache):
+        self.resolve(cache)
+
+    def resolve(self, cache):
+        if cache == 'cold':
+            loader.invalidate()
+        yodaplot.resolve_data_object(self.files[0], self.rivet_path, as_histogram=True,
+                                     **self.kwargs)
+
+
+class ReadFile:
+    """Read all data objects of a file."""
+
+    params = ([10, 100], [10, 1000])
+    param_names = ['observables', 'bins']
+
+    def setup(self, observables, nbins):
+        self.filename = synthetic.yoda_file(observables, nbins)
+        self.names = [synthetic.rivet_path(observable) for observable in range(observables)]
+        loader.invalidate()
+
+    def time_read_histograms(self, observables, nbins):
+        loader.invalidate()
+        loader.read_histograms(self.filename, self.names)
+
+    def peakmem_read_histograms(self, observables, nbins):
+        loader.invalidate()
+        loader.read_histograms(self.filename, self.names)
+
+
+class ParseFile:
+    """Parse a whole file with the YODA bindings or with the NumPy-based parser,
+    and convert its data objects into histograms."""
+
+    params = (['yoda', 'numpy'], [100, 1000], [10, 1000])
+    param_names = ['parser', 'observables', 'bins']
+    timeout = 300
+
+    def setup(self, parser, observables, nbins):
+        if parser == 'yoda' and importlib.util.find_spec('yoda') is None:
+            raise NotImplementedError("YODA is not installed")
+        self.filename = synthetic.yoda_file(observables, nbins)
+
+    def time_read(self, parser, observables, nbins):
+        self.read(parser)
+
+    def peakmem_read(self, parser, observables, nbins):
+        self.read(parser)
+
+    def read(self, parser):
+        if parser == 'yoda':
+            import yoda
+            data_objects = yoda.readYODA(self.filename)
+        else:
+            data_objects = yodatext.read(self.filename)
+        for data_object in data_objects.values():
+            if data_object.type in ('Histo1D', 'Scatter2D'):
+                Histogram.from_yoda(data_object)
+
+
+class LoadWithParser:
+    """Load a few data objects of a large file through the loader."""
+
+    params = (['yoda', 'numpy'], [10, 1000])
+    param_names = ['parser', 'bins']
+
+    def setup(self, parser, nbins):
+        if parser == 'yoda' and importlib.util.find_spec('yoda') is None:
+            raise NotImplementedError("YODA is not installed")
+        self.filename = synthetic.yoda_file(1000, nbins)
+        self.names = [synthetic.rivet_path(observable) for observable in range(0, 1000, 100)]
+        loader.set_parser(parser)
+
+    def teardown(self, parser, nbins):
+        loader.set_parser('auto')
+
+    def time_read_histograms(self, parser, nbins):
+        loader.invalidate()
+        loader.read_histograms(self.filename, self.names)
@@ -0,0 +1,177 @@
+"""Benchmark plotting data objects and saving the figures.
+
+The figures are not registered with pyplot, and are drawn with the Agg
+canvas, such that the results do not depend on the interactive backend."""
+
+import io
+import shutil
+
+import matplotlib
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from heppyplotlib import (configuration, gridplot, loader, ratioplot, rivetplot, yodaplot,
+                          RatioplotTemplate)
+
+from . import synthetic
+
+OBSERVABLES = 20
+# typical labels of Rivet plot info
+PLOT_INFO = {'Title': r'\PZ{} boson transverse momentum',
+             'XLabel': r'$p_\perp^{\PZ}$ [\GeV]',
+             'YLabel': r'$\mathrm{d}\sigma/\mathrm{d}p_\perp^{\PZ}$ [pb/\GeV]'}
+
+
+def new_axes():
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    return figure.add_subplot()
+
+
+class PlotDataObject:
+    """Plot a Histo1D or Scatter2D data object and draw the figure."""
+
+    params = (['Histo1D', 'Scatter2D'], [10, 1000, 10000])
+    param_names = ['type', 'bins']
+
+    def setup(self, type_name, nbins):
+        filename = synthetic.yoda_file(1, nbins)
+        rivet_path = synthetic.rivet_path(0)
+        if type_name == 'Scatter2D':
+            rivet_path = '/REF' + rivet_path
+        self.histogram = loader.load_histogram(filename, rivet_path)
+        self.plot_function = {'Histo1D': yodaplot.plot_histo1d,
+                              'Scatter2D': yodaplot.plot_scatter2d}[type_name]
+
+    def time_plot(self, type_name, nbins):
+        axes = new_axes()
+        self.plot_function(self.histogram, axes=axes)
+        axes.figure.canvas.draw()
+
+
+class Ratioplot:
+    """Plot a data object of several files into a ratio plot, either into a
+    new figure or by updating a RatioplotTemplate."""
+
+    params = ([2, 5], [10, 1000])
+    param_names = ['files', 'bins']
+
+    def setup(self, files, nbins):
+        self.files = synthetic.replica_files(files, OBSERVABLES, nbins)
+        self.rivet_paths = [synthetic.rivet_path(observable)
+                            for observable in range(OBSERVABLES)]
+        self.template = RatioplotTemplate(figure=Figure())
+        FigureCanvasAgg(self.template.figure)
+        # load the files and set up the template outside of the measurement
+        self.template.set_data(self.files, self.rivet_paths[-1], uses_rivet_plot_info=False)
+
+    def teardown(self, files, nbins):
+        self.template.close()
+
+    def time_ratioplot(self, files, nbins):
+        figure = Figure()
+        FigureCanvasAgg(figure)
+        ratioplot(self.files, self.rivet_paths[0], figure=figure, uses_rivet_plot_info=False)
+        figure.canvas.draw()
+
+    def peakmem_ratioplot(self, files, nbins):
+        figure = Figure()
+        FigureCanvasAgg(figure)
+        ratioplot(self.files, self.rivet_paths[0], figure=figure, uses_rivet_plot_info=False)
+        figure.canvas.draw()
+
+    def time_template_set_data(self, files, nbins):
+        self.template.set_data(self.files, self.rivet_paths[0], uses_rivet_plot_info=False)
+        self.template.figure.canvas.draw()
+
+
+class Gridplot:
+    """Plot all data objects of a file into a grid."""
+
+    params = ([4, 20], [10, 1000])
+    param_names = ['observables', 'bins']
+    timeout = 120
+
+    def setup(self, observables, nbins):
+        self.filename = synthetic.yoda_file(observables, nbins)
+        loader.invalidate()
+
+    def time_gridplot(self, observables, nbins):
+        figure = Figure()
+        FigureCanvasAgg(figure)
+        gridplot(self.filename, uses_rivet_plot_info=False, figure=figure)
+        figure.canvas.draw()
+
+    def peakmem_gridplot(self, observables, nbins):
+        figure = Figure()
+        FigureCanvasAgg(figure)
+        gridplot(self.filename, uses_rivet_plot_info=False, figure=figure)
+        figure.canvas.draw()
+
+
+class Savefig:
+    """Save a ratio plot in several formats."""
+
+    params = (['pdf', 'png', 'svg'], [10, 1000])
+    param_names = ['format', 'bins']
+
+    def setup(self, output_format, nbins):
+        files = synthetic.replica_files(2, OBSERVABLES, nbins)
+        self.figure = Figure()
+        FigureCanvasAgg(self.figure)
+        ratioplot(files, synthetic.rivet_path(0), figure=self.figure,
+                  uses_rivet_plot_info=False)
+
+    def time_savefig(self, output_format, nbins):
+        self.figure.savefig(io.BytesIO(), format=output_format)
+
+    def peakmem_savefig(self, output_format, nbins):
+        self.figure.savefig(io.BytesIO(), format=output_format)
+
+
+class RenderProfile:
+    """Render and save a ratio plot with labels from Rivet plot info, using the
+    publication profile (LaTeX, which must be installed) or the preview profile
+    (mathtext and rasterized error bands). Each measurement renders one plot,
+    either as a new figure that is configured like a pyplot one, or by
+    updating a RatioplotTemplate, whose labels are rendered with LaTeX
+    individually."""
+
+    params = (['publication', 'preview'], ['pdf', 'png'], ['ratioplot', 'template'])
+    param_names = ['profile', 'format', 'figure']
+
+    def setup(self, profile, output_format, figure_kind):
+        if profile == 'publication' and shutil.which('latex') is None:
+            raise NotImplementedError("The publication profile needs LaTeX.")
+        self.files = synthetic.replica_files(2, OBSERVABLES, 100)
+        # the publication profile configures LaTeX globally, restore it later
+        self.rc_params = {key: matplotlib.rcParams[key]
+                          for key in ('text.usetex', 'text.latex.preamble', 'font.family')}
+        configuration.use_profile(profile)
+        self.template = None
+        if figure_kind == 'template':
+            self.template = RatioplotTemplate(figure=Figure())
+            FigureCanvasAgg(self.template.figure)
+        # fill the caches of the labels and fonts outside of the measurement
+        self.time_render(profile, output_format, figure_kind)
+
+    def teardown(self, profile, output_format, figure_kind):
+        if self.template is not None:
+            self.template.close()
+        configuration.use_profile('publication')
+        matplotlib.rcParams.update(self.rc_params)
+
+    def time_render(self, profile, output_format, figure_kind):
+        rivet_path = synthetic.rivet_path(0)
+        if self.template is None:
+            figure = Figure()
+            FigureCanvasAgg(figure)
+            axes_list, _ = ratioplot(self.files, rivet_path, figure=figure,
+                                     uses_rivet_plot_info=False)
+            rivetplot.set_labels(PLOT_INFO, axes_list[0], axes_list[-1])
+        else:
+            figure = self.template.figure
+            self.template.set_data(self.files, rivet_path, uses_rivet_plot_info=False)
+            # like apply_plot_info for figures that are not managed by pyplot
+            rivetplot.set_labels(PLOT_INFO, *self.template.axes_list, configures_tex=False)
+        figure.savefig(io.BytesIO(), format=output_format)
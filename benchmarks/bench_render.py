@@ -0,0 +1,43 @@
+"""Benchmark drawing histograms as steps with error bands."""
+
+import time
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from heppyplotlib import yodaplot
+
+
+class StepWithErrorBand:
+    """Create and draw the artists of a number of overlaid histograms."""
+
+    params = ([100, 1000, 10000], [1, 10])
+    param_names = ['bins', 'overlays']
+
+    def setup(self, nbins, overlays):
+        edges = np.linspace(0.0, 1.0, nbins + 1)
+        self.lefts = edges[:-1]
+        self.widths = np.diff(edges)
+        rng = np.random.default_rng(1)
+        self.values = rng.uniform(1.0, 2.0, (overlays, nbins))
+        self.errs = 0.1 * self.values
+
+    def time_draw(self, nbins, overlays):
+        self.draw()
+
+    def track_draw_time_per_overlay(self, nbins, overlays):
+        self.draw()  # warm up
+        start = time.perf_counter()
+        self.draw()
+        return (time.perf_counter() - start) / overlays
+
+    track_draw_time_per_overlay.unit = "seconds"
+
+    def draw(self):
+        figure = Figure()
+        canvas = FigureCanvasAgg(figure)
+        axes = figure.add_subplot()
+        for values, errs in zip(self.values, self.errs):
+            yodaplot.plot_step_with_errorbar(self.lefts, self.widths, values, errs, axes=axes)
+        canvas.draw()
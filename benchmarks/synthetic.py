@@ -0,0 +1,153 @@
+"""Generate synthetic YODA files for the benchmarks.
+
+Each file holds n_observables Histo1D objects /BENCHMARK/dNN-x01-y01 with
+n_bins bins each, the corresponding Scatter2D reference data below /REF, and an
+event counter. Replica files differ by statistical fluctuations and a global
+scale, like the variations of a scale or PDF uncertainty band.
+
+Files are written to $HEPPYPLOTLIB_BENCHMARK_DIR, or to a directory within the
+temporary directory, and are reused as long as they exist. They can also be
+generated from the command line::
+
+    python -m benchmarks.synthetic --observables 100 --bins 50 --replicas 10 out_dir
+"""
+
+import argparse
+import os
+import tempfile
+
+import numpy as np
+
+
+def benchmark_dir():
+    """Return the directory for the generated files."""
+    directory = os.environ.get('HEPPYPLOTLIB_BENCHMARK_DIR',
+                               os.path.join(tempfile.gettempdir(), 'heppyplotlib-benchmarks'))
+    if not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def rivet_path(observable):
+    """Return the path of an observable."""
+    return '/BENCHMARK/d{:02d}-x01-y01'.format(observable + 1)
+
+
+def write_yoda_file(filename, n_observables, n_bins, seed=0, scale=1.0):
+    """Write a synthetic YODA file."""
+    rng = np.random.RandomState(seed)
+    edges = np.linspace(0.0, 100.0, n_bins + 1)
+    lows, highs = edges[:-1], edges[1:]
+    widths = highs - lows
+    mids = (lows + highs) / 2.0
+    blocks = [_counter_block('/_EVTCOUNT', 1e6)]
+    for observable in range(n_observables):
+        # a falling spectrum with a per-observable slope
+        shape = np.exp(-mids / (20.0 + observable % 7))
+        sumw = scale * 1e3 * shape * widths * rng.normal(1.0, 0.05, n_bins)
+        sumw2 = np.abs(sumw) * 1e-2
+        num_entries = np.maximum(np.round(np.abs(sumw) * 10), 1)
+        blocks.append(_histo1d_block(rivet_path(observable), lows, highs, sumw, sumw2,
+                                     sumw * mids, sumw * mids**2, num_entries))
+        ref_values = 1e3 * shape * rng.normal(1.0, 0.02, n_bins)
+        ref_errs = 0.05 * np.abs(ref_values)
+        blocks.append(_scatter2d_block('/REF' + rivet_path(observable), mids, widths / 2.0,
+                                       ref_values, ref_errs))
+    with open(filename, 'w') as yoda_file:
+        yoda_file.write('\n'.join(blocks))
+
+
+def yoda_file(n_observables, n_bins, replica=0):
+    """Return the name of a synthetic YODA file, which is generated if it does
+    not exist yet. Replica 0 is the central one."""
+    filename = os.path.join(benchmark_dir(), 'synthetic-{}x{}-{}.yoda'.format(
+        n_observables, n_bins, replica))
+    if not os.path.exists(filename):
+        # write to a temporary file first, benchmarks might run in parallel
+        temporary_filename = '{}.{}.tmp'.format(filename, os.getpid())
+        scale = 1.0 if replica == 0 else np.random.RandomState(replica).normal(1.0, 0.1)
+        write_yoda_file(temporary_filename, n_observables, n_bins, seed=replica, scale=scale)
+        os.replace(temporary_filename, filename)
+    return filename
+
+
+def replica_files(n_replicas, n_observables, n_bins):
+    """Return the names of n_replicas synthetic YODA files, the first one being
+    the central one."""
+    return [yoda_file(n_observables, n_bins, replica) for replica in range(n_replicas)]
+
+
+def replica_archive(n_replicas, n_observables, n_bins):
+    """Return the name of a replica archive of n_replicas synthetic YODA
+    files, which is packed if it does not exist yet."""
+    from heppyplotlib import replicastore
+    filename = os.path.join(benchmark_dir(), 'synthetic-{}x{}-{}.replicas'.format(
+        n_observables, n_bins, n_replicas))
+    if not os.path.exists(filename):
+        replicastore.pack(replica_files(n_replicas, n_observables, n_bins), filename)
+    return filename
+
+
+def _counter_block(path, sumw):
+    return ('BEGIN YODA_COUNTER_V2 {0}\n'
+            'Path: {0}\n'
+            'Title: \n'
+            'Type: Counter\n'
+            '---\n'
+            '# sumW\t sumW2\t numEntries\n'
+            '{1:.6e}\t{1:.6e}\t{2:d}\n'
+            'END YODA_COUNTER_V2\n').format(path, sumw, int(sumw))
+
+
+def _histo1d_block(path, lows, highs, sumw, sumw2, sumwx, sumwx2, num_entries):
+    totals = [sumw.sum(), sumw2.sum(), sumwx.sum(), sumwx2.sum(), num_entries.sum()]
+    rows = np.column_stack([lows, highs, sumw, sumw2, sumwx, sumwx2, num_entries])
+    lines = ['BEGIN YODA_HISTO1D_V2 {}'.format(path),
+             'Path: {}'.format(path),
+             'Title: ',
+             'Type: Histo1D',
+             '---',
+             '# Mean: {:.6e}'.format(totals[2] / totals[0]),
+             '# Area: {:.6e}'.format(totals[0]),
+             '# ID\t ID\t sumw\t sumw2\t sumwx\t sumwx2\t numEntries',
+             'Total   \tTotal   \t{:.6e}\t{:.6e}\t{:.6e}\t{:.6e}\t{:d}'.format(
+                 *(totals[:4] + [int(totals[4])])),
+             'Underflow\tUnderflow\t0.000000e+00\t0.000000e+00\t0.000000e+00\t0.000000e+00\t0',
+             'Overflow\tOverflow\t0.000000e+00\t0.000000e+00\t0.000000e+00\t0.000000e+00\t0',
+             '# xlow\t xhigh\t sumw\t sumw2\t sumwx\t sumwx2\t numEntries']
+    lines.extend('{:.6e}\t{:.6e}\t{:.6e}\t{:.6e}\t{:.6e}\t{:.6e}\t{:d}'.format(
+        *(list(row[:6]) + [int(row[6])])) for row in rows)
+    lines.append('END YODA_HISTO1D_V2\n')
+    return '\n'.join(lines)
+
+
+def _scatter2d_block(path, x, x_errs, y, y_errs):
+    rows = np.column_stack([x, x_errs, x_errs, y, y_errs, y_errs])
+    lines = ['BEGIN YODA_SCATTER2D_V2 {}'.format(path),
+             'Path: {}'.format(path),
+             'Title: ',
+             'Type: Scatter2D',
+             '---',
+             '# xval\t xerr-\t xerr+\t yval\t yerr-\t yerr+']
+    lines.extend('\t'.join('{:.6e}'.format(value) for value in row) for row in rows)
+    lines.append('END YODA_SCATTER2D_V2\n')
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic YODA files.")
+    parser.add_argument('output_dir')
+    parser.add_argument('--observables', type=int, default=100)
+    parser.add_argument('--bins', type=int, default=50)
+    parser.add_argument('--replicas', type=int, default=1)
+    args = parser.parse_args()
+    if not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+    for replica in range(args.replicas):
+        scale = 1.0 if replica == 0 else np.random.RandomState(replica).normal(1.0, 0.1)
+        write_yoda_file(os.path.join(args.output_dir, 'replica-{}.yoda'.format(replica)),
+                        args.observables, args.bins, seed=replica, scale=scale)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,59 @@
 """
 A package for plotting histogrammed data with special support for high energy
 physics applications.
+
+Submodules and the heavy dependencies (matplotlib, numpy, YODA and Rivet) are
+only imported once they are used, such that importing heppyplotlib is cheap.
 """
 
-from .plot import *
-from .ratioplot import ratioplot, layout_axes_column, ratioplot_setup_axes
-from .errorcalc import *
+import importlib
+
+from .plot import gridplot, paged_gridplot, plot, rivet_paths
+from .ratioplot import RatioplotTemplate, ratioplot, layout_axes_column, ratioplot_setup_axes
 
 __version__ = "0.1.dev"
+
+# public names that are imported from their submodule on first access
+_lazy_names = {
+    'combine': 'errorcalc',
+    'combine_many': 'errorcalc',
+    'accumulate': 'errorcalc',
+    'scatter_with_errors': 'errorcalc',
+    'standard_error': 'errorcalc',
+    'asymmetric_hessian_error': 'errorcalc',
+    'envelope_error': 'errorcalc',
+    'make_accumulator': 'errorcalc',
+    'merge_accumulators': 'errorcalc',
+    'save_accumulator': 'errorcalc',
+    'load_accumulator': 'errorcalc',
+    'CollectingAccumulator': 'errorcalc',
+    'StandardErrorAccumulator': 'errorcalc',
+    'AsymmetricHessianErrorAccumulator': 'errorcalc',
+    'EnvelopeErrorAccumulator': 'errorcalc',
+}
+
+# submodules that are imported on first access, as "import heppyplotlib" does
+# not import them anymore (plot and ratioplot are shadowed by their functions)
+_lazy_submodules = ('arithmetic', 'command_line', 'configuration', 'errorcalc', 'histogram',
+                    'instrumentation', 'loader', 'rebinning', 'replicastore', 'rivetplot',
+                    'sidecar', 'watch', 'yodaindex', 'yodaplot', 'yodatext')
+
+__all__ = ['gridplot', 'paged_gridplot', 'plot', 'rivet_paths',
+           'RatioplotTemplate', 'ratioplot', 'layout_axes_column', 'ratioplot_setup_axes'] + sorted(_lazy_names)
+
+
+def __getattr__(name):
+    if name in _lazy_submodules:
+        # importing a submodule also binds it as an attribute of the package
+        return importlib.import_module('.' + name, __name__)
+    try:
+        module_name = _lazy_names[name]
+    except KeyError:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(importlib.import_module('.' + module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_names) | set(_lazy_submodules))
@@ -0,0 +1,88 @@
+"""Arithmetic on the values and errors of binned data, including error
+propagation.
+
+All functions take values y with the shape (..., bins) and lower and upper
+errors y_errs with the shape (..., 2, bins), such that a whole stack of data
+objects can be processed at once. The operand values and errors are broadcast
+against them. assume_correlated is a bool, or an array of bools with one entry
+per data object of the stack."""
+
+import numpy as np
+
+
+def scale(y, y_errs, factor):
+    """Return y * factor and its errors."""
+    return np.asarray(y) * factor, np.asarray(y_errs) * factor
+
+
+def subtract(y, y_errs, operand_y, operand_y_errs, assume_correlated=False):
+    """Return y - operand_y and its errors."""
+    y, y_errs, operand_y, operand_y_errs = _as_arrays(y, y_errs, operand_y, operand_y_errs)
+    new_y = y - operand_y
+    correlated_errs = y_errs - operand_y[..., np.newaxis, :]
+    # assume that we subtract an independent data set, use error propagation
+    uncorrelated_errs = np.sqrt(np.where(y[..., np.newaxis, :] != 0.0, y_errs**2, 0.0)
+                                + operand_y_errs**2)
+    return new_y, np.where(_errs_mask(assume_correlated), correlated_errs, uncorrelated_errs)
+
+
+def divide(y, y_errs, operand_y, operand_y_errs, assume_correlated=False):
+    """Return y / operand_y and its errors. Bins with a vanishing operand are
+    set to 1 with vanishing errors."""
+    return _divide_or_multiply(y, y_errs, operand_y, operand_y_errs, assume_correlated,
+                               divides=True)
+
+
+def multiply(y, y_errs, operand_y, operand_y_errs, assume_correlated=False):
+    """Return y * operand_y and its errors. Bins with a vanishing operand are
+    set to 0 with vanishing errors."""
+    return _divide_or_multiply(y, y_errs, operand_y, operand_y_errs, assume_correlated,
+                               divides=False)
+
+
+def deviate(y, y_errs, operand_y, operand_y_errs):
+    """Return the deviation of y from operand_y in units of their combined
+    (lower) uncorrelated errors. The returned errors vanish, unless all values
+    of a data object are equal to the operand, then they are set to 1."""
+    y, y_errs, operand_y, operand_y_errs = _as_arrays(y, y_errs, operand_y, operand_y_errs)
+    differences = y - operand_y
+    errs = np.sqrt(y_errs**2 + operand_y_errs**2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        new_y = differences / errs[..., 0, :]
+    is_equal = np.all(differences == 0.0, axis=-1)
+    new_y_errs = np.broadcast_to(np.where(is_equal, 1.0, 0.0)[..., np.newaxis, np.newaxis],
+                                 errs.shape).copy()
+    return new_y, new_y_errs
+
+
+def _divide_or_multiply(y, y_errs, operand_y, operand_y_errs, assume_correlated, divides):
+    y, y_errs, operand_y, operand_y_errs = _as_arrays(y, y_errs, operand_y, operand_y_errs)
+    vanishes = operand_y == 0.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if divides:
+            new_y = np.where(vanishes, 1.0, y / operand_y)
+            correlated_errs = y_errs / operand_y[..., np.newaxis, :]
+        else:
+            new_y = np.where(vanishes, 0.0, y * operand_y)
+            correlated_errs = y_errs * operand_y[..., np.newaxis, :]
+        # assume that we divide/multiply through an independent data set, use error propagation
+        rel_errs2 = (np.where(y[..., np.newaxis, :] != 0.0, (y_errs / y[..., np.newaxis, :])**2, 0.0)
+                     + (operand_y_errs / operand_y[..., np.newaxis, :])**2)
+        uncorrelated_errs = np.sqrt(rel_errs2) * new_y[..., np.newaxis, :]
+    new_y_errs = np.where(_errs_mask(assume_correlated), correlated_errs, uncorrelated_errs)
+    return new_y, np.where(vanishes[..., np.newaxis, :], 0.0, new_y_errs)
+
+
+def _as_arrays(y, y_errs, operand_y, operand_y_errs):
+    y = np.asarray(y, dtype=np.float64)
+    operand_y = np.asarray(operand_y, dtype=np.float64)
+    if not y.shape[-1] == operand_y.shape[-1]:
+        raise Exception("The operand has {} bins instead of {}.".format(operand_y.shape[-1],
+                                                                         y.shape[-1]))
+    return (y, np.asarray(y_errs, dtype=np.float64),
+            operand_y, np.asarray(operand_y_errs, dtype=np.float64))
+
+
+def _errs_mask(assume_correlated):
+    assume_correlated = np.asarray(assume_correlated, dtype=bool)
+    return assume_correlated.reshape(assume_correlated.shape + (1, 1))
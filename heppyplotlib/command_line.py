@@ -1,9 +1,429 @@
+"""Command line tools of heppyplotlib."""
+
+from __future__ import print_function
+
+import argparse
+import fnmatch
+import importlib.util
+import logging
+import multiprocessing
+import os
+import re
 import sys
+import time
+
+# the ratio plot templates of this process, by the labels of the data objects
+_ratioplot_templates = {}
+
+
+def plot():
+    """Plot a single data object of a YODA file (the hpl-plot command)."""
+    if not len(sys.argv) == 3:
+        print("usage: {} analysis.yoda /ANALYSIS/HISTOGRAM".format(sys.argv[0]))
+        sys.exit(1)
+
+    import heppyplotlib as hpl
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    hpl.plot(sys.argv[1], sys.argv[2])
+
+
+def render(argv=None):
+    """Render all matching data objects of YODA files into image files (the
+    hpl-render command), and return the exit status."""
+    from . import configuration, instrumentation
+
+    args = render_argument_parser().parse_args(argv)
+    log_level = logging_level(args.verbose)
+    logging.basicConfig(level=log_level, format='%(levelname)s: %(message)s')
+    configuration.use_profile('preview' if args.preview else 'publication')
+    if args.profile or args.trace:
+        instrumentation.enable()
+    if args.uses_rivet_plot_info is None:
+        args.uses_rivet_plot_info = importlib.util.find_spec('rivet') is not None
+    labels = args.labels or [yoda_file_label(filename) for filename in args.files]
+    if not len(labels) == len(args.files):
+        print("error: there must be one label per YODA file")
+        return 2
+    args.formats = args.formats or ['pdf']
+    if args.watch and args.manifest is None:
+        args.manifest = os.path.join(args.output_dir, '.hpl-render-manifest.json')
+    manifest = None
+    if args.manifest is not None:
+        from .watch import Manifest
+        manifest = Manifest(args.manifest)
+
+    if not args.watch:
+        status = render_once(args, labels, manifest, log_level)
+    else:
+        status = watch_and_render(args, labels, manifest, log_level)
+    if args.profile:
+        instrumentation.write_json(args.profile)
+    if args.trace:
+        instrumentation.write_chrome_trace(args.trace)
+    return status
+
+
+def render_once(args, labels, manifest=None, log_level=None):
+    """Render the plots of hpl-render once, skipping the plots that the
+    manifest knows to be up to date, and return the exit status."""
+    rivet_paths = matching_rivet_paths(args.files, args.paths, args.uses_regex)
+    if not rivet_paths:
+        print("No matching data objects found.")
+        return 1
+    tasks = [(args.files, rivet_path, output_base(args.output_dir, rivet_path), args.formats,
+              args.uses_ratioplot, args.uses_rivet_plot_info, labels)
+             for rivet_path in rivet_paths]
+    digests = {}
+    if manifest is not None:
+        digests = {task[2]: render_task_digest(task) for task in tasks}
+        tasks = [task for task in tasks
+                 if not manifest.is_up_to_date(task[2], digests[task[2]])]
+        if not tasks:
+            if not args.watch:
+                print("All {} plots are up to date.".format(len(rivet_paths)))
+            return 0
+
+    start = time.time()
+    failures = []
+    file_count = 0
+    output_base_names = {task[1]: task[2] for task in tasks}
+    for rivet_path, written_files, error in render_tasks(tasks, args.processes,
+                                                         log_level=log_level):
+        if error is None:
+            file_count += len(written_files)
+            if manifest is not None:
+                manifest.record(output_base_names[rivet_path],
+                                digests[output_base_names[rivet_path]], written_files)
+        else:
+            failures.append((rivet_path, error))
+            if manifest is not None:
+                manifest.forget(output_base_names[rivet_path])
+    duration = time.time() - start
+    if manifest is not None:
+        manifest.save()
+
+    rendered_count = len(tasks) - len(failures)
+    print("Rendered {} of {} plots ({} files) in {:.1f} s, {:.1f} plots/s.".format(
+        rendered_count, len(tasks), file_count, duration,
+        rendered_count / duration if duration > 0 else 0.0))
+    if manifest is not None and len(tasks) < len(rivet_paths):
+        print("Skipped {} plots that are up to date.".format(len(rivet_paths) - len(tasks)))
+    if failures:
+        print("Failed to render {} plots:".format(len(failures)))
+        for rivet_path, error in sorted(failures):
+            print("  {}: {}".format(rivet_path, error))
+        return 1
+    return 0
+
+
+def watch_and_render(args, labels, manifest, log_level=None):
+    """Render the plots of hpl-render whenever their inputs change, until the
+    process is interrupted.
+
+    Files that are still being written, i.e. whose modification time or size
+    has changed since the last poll, are waited for before rendering. The
+    YODA files and the .plot files of the rendered plots are stat'ed once per
+    poll, and the digests are only recomputed when their state has changed
+    since the last render."""
+    from .watch import files_state
+    print("Watching {} files, press Ctrl+C to stop.".format(len(args.files)))
+    plot_files = []
+    state = None
+    rendered_state = None
+    try:
+        while True:
+            new_state = (files_state(args.files), files_state(plot_files))
+            if new_state == state and None not in new_state[0] and new_state != rendered_state:
+                render_once(args, labels, manifest, log_level)
+                # the rendered plots and hence their .plot files might have changed
+                plot_files = watched_plot_files(args)
+                new_state = (new_state[0], files_state(plot_files))
+                rendered_state = new_state
+            state = new_state
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        return 0
+
+
+def watched_plot_files(args):
+    """Return the .plot files that might hold plot information for the plots
+    of hpl-render, whether they exist or not."""
+    if not args.uses_rivet_plot_info:
+        return []
+    from . import rivetplot
+    plot_files = set()
+    for rivet_path in matching_rivet_paths(args.files, args.paths, args.uses_regex):
+        plot_files.update(rivetplot.plot_files(rivet_path))
+    return sorted(plot_files)
+
+
+def render_task_digest(task):
+    """Return the digest of the inputs of a task of render_tasks."""
+    from . import __version__, configuration
+    from .watch import observable_digest
+    files, rivet_path, _, formats, uses_ratioplot, uses_rivet_plot_info, labels = task
+    plot_files = ()
+    if uses_rivet_plot_info:
+        from . import rivetplot
+        plot_files = rivetplot.plot_files(rivet_path)
+    settings = {'formats': formats, 'ratio': uses_ratioplot,
+                'plot_info': uses_rivet_plot_info, 'labels': labels,
+                'profile': configuration.profile(), 'version': __version__}
+    return observable_digest(files, rivet_path, settings, plot_files)
+
+
+def pack(argv=None):
+    """Pack replica YODA files into a replica archive (the hpl-pack command),
+    and return the exit status."""
+    parser = argparse.ArgumentParser(
+        description="Pack the Histo1D and Scatter2D data objects of replica YODA "
+                    "files into an archive, from which errorcalc.combine reads all "
+                    "replicas of a data object at once.")
+    parser.add_argument('archive', help="the archive to be written")
+    parser.add_argument('files', nargs='+', metavar='FILE',
+                        help="the YODA files, starting with the central replica")
+    parser.add_argument('-p', '--path', dest='paths', action='append', metavar='PATTERN',
+                        help="pack only data objects whose path matches the glob "
+                             "PATTERN, can be given several times")
+    parser.add_argument('--float32', action='store_true',
+                        help="store the replica values with single precision")
+    args = parser.parse_args(argv)
+
+    import numpy as np
+    from . import replicastore
+
+    rivet_paths = matching_rivet_paths(args.files[:1], args.paths) if args.paths else None
+    start = time.time()
+    count = replicastore.pack(args.files, args.archive, rivet_paths,
+                              dtype=np.float32 if args.float32 else np.float64)
+    print("Packed {} data objects of {} files in {:.1f} s.".format(
+        count, len(args.files), time.time() - start))
+    return 0
+
+
+def render_argument_parser():
+    """Return the argument parser of the hpl-render command."""
+    parser = argparse.ArgumentParser(
+        description="Render the Histo1D and Scatter2D data objects found in all of "
+                    "the given YODA files. Each data object is rendered into one "
+                    "figure, in which the files are compared.")
+    parser.add_argument('files', nargs='+', metavar='FILE',
+                        help="the YODA files")
+    parser.add_argument('-p', '--path', dest='paths', action='append', metavar='PATTERN',
+                        help="render only data objects whose path matches the glob "
+                             "PATTERN (or regex with --regex), can be given several "
+                             "times; by default all data objects except /REF/, /RAW/ "
+                             "and /_ ones are rendered")
+    parser.add_argument('--regex', dest='uses_regex', action='store_true',
+                        help="interpret the path patterns as regular expressions")
+    parser.add_argument('-f', '--format', dest='formats', action='append', metavar='FORMAT',
+                        help="an output format like pdf or png, can be given several "
+                             "times (default: pdf)")
+    parser.add_argument('-o', '--output-dir', default='plots',
+                        help="the output directory (default: plots)")
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help="the number of worker processes (default: number of CPUs)")
+    parser.add_argument('-r', '--ratio', dest='uses_ratioplot', action='store_true',
+                        help="render ratio plots, dividing by the first file")
+    parser.add_argument('-l', '--label', dest='labels', action='append',
+                        help="the legend label of a file, given once per file "
+                             "(default: the file names)")
+    plot_info = parser.add_mutually_exclusive_group()
+    plot_info.add_argument('--plot-info', dest='uses_rivet_plot_info',
+                           action='store_true', default=None,
+                           help="use Rivet plot info (default: if Rivet is installed)")
+    plot_info.add_argument('--no-plot-info', dest='uses_rivet_plot_info',
+                           action='store_false')
+    parser.add_argument('--preview', action='store_true',
+                        help="render quickly for a first look: translate the labels "
+                             "into mathtext instead of running LaTeX, and rasterize "
+                             "the error bands")
+    parser.add_argument('-v', '--verbose', action='count', default=0,
+                        help="log what is plotted, give twice for debug output")
+    parser.add_argument('--profile', metavar='FILE',
+                        help="write the time spent per stage (load, resolve, rebin, "
+                             "plot_info, artists, savefig) and per call as JSON")
+    parser.add_argument('--trace', metavar='FILE',
+                        help="write the calls of the stages as a Chrome trace")
+    parser.add_argument('--manifest', metavar='FILE',
+                        help="skip the plots whose data objects, plot info and "
+                             "settings are unchanged since they were recorded in "
+                             "the manifest FILE, and record the rendered plots")
+    parser.add_argument('-w', '--watch', action='store_true',
+                        help="keep watching the files and render the plots whose "
+                             "inputs changed, using the manifest "
+                             "OUTPUT_DIR/.hpl-render-manifest.json by default")
+    parser.add_argument('--interval', type=float, default=2.0, metavar='SECONDS',
+                        help="the polling interval of --watch (default: 2)")
+    return parser
+
+
+def logging_level(verbosity):
+    """Return the logging level for a number of -v flags."""
+    return {0: logging.WARNING, 1: logging.INFO}.get(verbosity, logging.DEBUG)
+
+
+def matching_rivet_paths(files, patterns=None, uses_regex=False):
+    """Return the paths of the Histo1D and Scatter2D data objects that are
+    found in all files and match any of the glob (or regex) patterns.
+
+    Without patterns, auxiliary data objects are skipped, see
+    :py:func:`heppyplotlib.yodaplot.is_auxiliary_rivet_path`."""
+    from . import yodaplot
+    rivet_paths = None
+    for filename in files:
+        file_paths = yodaplot.histogram_names(filename, skips_auxiliary=False)
+        if rivet_paths is None:
+            rivet_paths = file_paths
+        else:
+            file_paths = set(file_paths)
+            rivet_paths = [name for name in rivet_paths if name in file_paths]
+    if not patterns:
+        return [name for name in rivet_paths if not yodaplot.is_auxiliary_rivet_path(name)]
+    if uses_regex:
+        expressions = [re.compile(pattern) for pattern in patterns]
+        return [name for name in rivet_paths
+                if any(expression.search(name) for expression in expressions)]
+    return [name for name in rivet_paths
+            if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)]
+
+
+def yoda_file_label(filename):
+    """Return a legend label for a YODA file."""
+    label = os.path.basename(filename)
+    for suffix in ('.gz', '.xz', '.yoda'):
+        if label.endswith(suffix):
+            label = label[:-len(suffix)]
+    return label
+
+
+def output_base(output_dir, rivet_path):
+    """Return the output file name without extension for a data object, e.g.
+    output_dir/ANALYSIS/d01-x01-y01."""
+    return os.path.join(output_dir, *rivet_path.strip('/').split('/'))
+
+
+def render_tasks(tasks, processes=None, log_level=None):
+    """Render tasks using a pool of processes, and yield a (rivet path, written
+    files, error) tuple for each finished task, where error is None on
+    success.
+
+    If instrumentation is enabled, the calls recorded by the workers are added
+    to the ones of this process. The workers use the rendering profile of
+    this process."""
+    from . import configuration, instrumentation
+    use_agg_backend()
+    if processes == 1 or len(tasks) == 1:
+        for task in tasks:
+            result = _render_task(task)
+            instrumentation.add_events(result[3])
+            yield result[:3]
+        return
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = min(processes, len(tasks))
+    # keep neighbouring tasks on the same worker to reuse its loader cache
+    chunksize = max(1, len(tasks) // (4 * processes))
+    with multiprocessing.Pool(processes, initializer=_init_worker,
+                              initargs=(log_level, instrumentation.is_enabled(),
+                                        configuration.profile())) as pool:
+        for result in pool.imap_unordered(_render_task, tasks, chunksize):
+            instrumentation.add_events(result[3])
+            yield result[:3]
+
+
+def render_observable(files, rivet_path, output_base_name, formats,
+                      uses_ratioplot=False, uses_rivet_plot_info=True, labels=None):
+    """Render a data object from one or several YODA files into a figure,
+    save it once per format and return the written file names.
+
+    Ratio plots are rendered with a RatioplotTemplate that is kept for the
+    following data objects. Otherwise, the figure is closed afterwards, also
+    if rendering fails."""
+    import matplotlib.pyplot as plt
+    from .plot import plot
+
+    if labels is None:
+        labels = [yoda_file_label(filename) for filename in files]
+    if uses_ratioplot:
+        template = _ratioplot_template(labels)
+        try:
+            template.set_data(files, rivet_path, uses_rivet_plot_info=uses_rivet_plot_info)
+            return save_figure(template.figure, output_base_name, formats)
+        except Exception:
+            # the template might be left in an inconsistent state
+            _ratioplot_templates.pop(tuple(labels)).close()
+            raise
+    try:
+        plt.figure()
+        for filename, label in zip(files, labels):
+            plot(filename, rivet_path, uses_rivet_plot_info=uses_rivet_plot_info,
+                 label=label)
+        if len(files) > 1:
+            plt.legend()
+        return save_figure(plt.gcf(), output_base_name, formats)
+    finally:
+        plt.close('all')
+
+
+def save_figure(figure, output_base_name, formats):
+    """Save a figure once per format and return the written file names."""
+    from . import instrumentation
+    output_dir = os.path.dirname(output_base_name)
+    if output_dir and not os.path.isdir(output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+    written_files = []
+    for output_format in formats:
+        filename = output_base_name + '.' + output_format
+        try:
+            with instrumentation.timed('savefig'):
+                figure.savefig(filename)
+        except Exception:
+            # do not leave a partially written file behind
+            if os.path.exists(filename):
+                os.remove(filename)
+            raise
+        written_files.append(filename)
+    return written_files
+
+
+def use_agg_backend():
+    """Make matplotlib render into files only."""
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def _ratioplot_template(labels):
+    from .ratioplot import RatioplotTemplate
+    try:
+        return _ratioplot_templates[tuple(labels)]
+    except KeyError:
+        template = RatioplotTemplate(labels=labels)
+        _ratioplot_templates[tuple(labels)] = template
+        return template
+
+
+def _init_worker(log_level, instrumented, profile='publication'):
+    from . import configuration, instrumentation
+    use_agg_backend()
+    configuration.use_profile(profile)
+    if log_level is not None:
+        logging.basicConfig(level=log_level, format='%(levelname)s: %(message)s')
+    if instrumented:
+        instrumentation.enable()
+
 
-import heppyplotlib as hpl
+def _render_task(task):
+    from . import instrumentation
+    rivet_path = task[1]
+    try:
+        result = rivet_path, render_observable(*task), None
+    except Exception as error:
+        result = rivet_path, [], "{}: {}".format(type(error).__name__, error)
+    # hand the calls recorded by a worker process over to the parent process
+    return result + (instrumentation.take_events(),)
 
-if not len(sys.argv) == 3:
-    print("usage: {} analysis.yoda /ANALYSIS/HISTOGRAM".format(sys.argv[0]))
-    sys.exit(1)
 
-hpl.plot(sys.argv[1], sys.argv[2])
+if __name__ == '__main__':
+    plot()
@@ -1,22 +1,37 @@
-"""Configure heppyplotlib or the underlying matplotlib."""
+"""Configure heppyplotlib or the underlying matplotlib.
 
-import matplotlib.pyplot as plt
+Figures are rendered with one of two profiles. The publication profile, which
+is the default, renders the labels from Rivet plot info with LaTeX (see
+use_tex). The preview profile is much faster for pages of plots: it never runs
+LaTeX, but translates the labels into matplotlib's mathtext, renders with the
+Agg backend and rasterizes error bands, such that vector output stays small.
+"""
+
+import functools
+import logging
+
+PROFILES = ('publication', 'preview')
+
+_logger = logging.getLogger(__name__)
+_profile = 'publication'
+_serif_preamble = [r'\usepackage{amsmath}',
+                   r'\usepackage{siunitx}',
+                   r'\usepackage{hepnames}']
 
 def use_tex(use_serif=True, overwrite=True, preamble=None):
     """Configure pyplot to use LaTeX for text rendering."""
+    import matplotlib.pyplot as plt
 
     if plt.rcParams['text.usetex'] and not overwrite:
-        print("Will not override tex settings ...")
+        _logger.info("Will not override tex settings ...")
         return
 
-    print("Will use tex for rendering ...")
+    _logger.info("Will use tex for rendering ...")
 
     if preamble is None:
         if use_serif:
             plt.rc('font', family='serif')
-            preamble = [r'\usepackage{amsmath}',
-                        r'\usepackage{siunitx}',
-                        r'\usepackage{hepnames}']
+            preamble = _serif_preamble
         else:
             # note that we do not even have a capital delta character (\Delta) apparently ...
             # TODO: use a more complete sans serif font
@@ -31,6 +46,31 @@ def use_tex(use_serif=True, overwrite=True, preamble=None):
     plt.rc('text', usetex=True)
 
 
+def use_tex_for_text(text):
+    """Render a matplotlib Text with LaTeX, without changing the global
+    settings.
+
+    Unless a LaTeX preamble has been configured, the preamble of use_tex is
+    used while the text is drawn or measured, such that the text of other
+    figures is left alone."""
+    text.set_usetex(True)
+    if 'draw' in vars(text):
+        # the methods are already wrapped
+        return
+    for method_name in ('draw', 'get_window_extent'):
+        setattr(text, method_name,
+                functools.partial(_with_tex_preamble, getattr(text, method_name)))
+
+
+def _with_tex_preamble(method, *args, **kwargs):
+    import matplotlib
+
+    if matplotlib.rcParams['text.latex.preamble']:
+        return method(*args, **kwargs)
+    with matplotlib.rc_context({'text.latex.preamble': " ".join(_serif_preamble)}):
+        return method(*args, **kwargs)
+
+
 def set_font_sizes(normal=9, small=8, large=10):
     r"""Configure pyplot to use these two font sizes.
 
@@ -44,6 +84,7 @@ def set_font_sizes(normal=9, small=8, large=10):
 
     e.g. extract the font sizes for captions and subcaptions (as in the example)
     """
+    import matplotlib.pyplot as plt
     params = {'font.size': normal,        # \thefontsize\small (like captions)
               'figure.titlesize': large,
               'axes.titlesize': normal,
@@ -64,7 +105,36 @@ def set_figure_size(latex_width, aspect_ratio=0.6875):
         \the\textwidth
 
     """
+    import matplotlib.pyplot as plt
     tex_points_per_inch = 72.27
     inches_per_tex_point = 1.0 / tex_points_per_inch
     inches_width = latex_width * inches_per_tex_point
     plt.rc('figure', figsize=[inches_width, inches_width * aspect_ratio])
+
+
+def use_profile(name):
+    """Choose the profile for rendering figures, 'publication' or 'preview'.
+
+    The preview profile switches matplotlib to the Agg backend and disables
+    LaTeX. The publication profile configures LaTeX again once labels are
+    set from Rivet plot info."""
+    global _profile
+    if name not in PROFILES:
+        raise ValueError("Unknown profile {!r}, use one of {}.".format(
+            name, ", ".join(PROFILES)))
+    _profile = name
+    if name == 'preview':
+        import matplotlib
+        matplotlib.use('Agg')
+        matplotlib.rcParams['text.usetex'] = False
+    _logger.info("Will use the %s profile for rendering ...", name)
+
+
+def profile():
+    """Return the name of the profile that is used for rendering figures."""
+    return _profile
+
+
+def is_preview():
+    """Return whether figures are rendered with the preview profile."""
+    return _profile == 'preview'
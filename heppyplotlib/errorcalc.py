@@ -1,83 +1,505 @@
 """Functions for calculating errors by combining different datasets."""
 
-import math
+from collections import OrderedDict
+import logging
+
 import numpy as np
 
-def combine(files, rivet_path, error_calc, rebin_count=None, rebin_counts=None, rebin_begin=0, ignore_missing_files=False):
+_logger = logging.getLogger(__name__)
+
+def combine(files, rivet_path, error_calc, rebin_count=None, rebin_counts=None, rebin_begin=0, ignore_missing_files=False,
+            streaming=False, processes=None, as_histogram=False):
     """Combine files[1]/rivet_path, files[2]/rivet_path, ...
     using an error_calc function from the heppyplotlib.error_calc
-    module and return a YODA data object.
+    module and return a YODA Scatter2D, or a Scatter2D-like
+    :py:class:`heppyplotlib.histogram.Histogram` if as_histogram is True or
+    YODA is not installed.
+
+    An error_calc function takes a (datasets x bins) array and returns the
+    negative and positive errors as a (2 x bins) array.
 
-    files[0] is supposed to be the CV data set.
+    files[0] is supposed to be the CV data set. files can also be the file name
+    of a replica archive written with :py:func:`heppyplotlib.replicastore.pack`,
+    or an open :py:class:`heppyplotlib.replicastore.ReplicaStore`, from which
+    all replicas are read as a single block. Then rebin_counts can not be used.
+
+    If streaming is True, the files are read one at a time and only running
+    accumulators are kept (see make_accumulator), such that the peak memory
+    does not depend on the number of files. If processes is given, the files
+    are read in streaming mode by a pool of that many worker processes.
     """
+    if _is_replica_store(files):
+        if rebin_counts is not None:
+            raise Exception("Replica archives can only be rebinned using 'rebin_count'.")
+        from . import replicastore
+        return replicastore.combine(files, rivet_path, error_calc,
+                                    rebin_count=rebin_count, rebin_begin=rebin_begin,
+                                    as_histogram=as_histogram)
+    rebin_counts = _normalize_rebin_counts(files, rebin_count, rebin_counts)
+    if streaming or processes is not None:
+        accumulator = accumulate(files, rivet_path, error_calc,
+                                 rebin_counts=rebin_counts, rebin_begin=rebin_begin,
+                                 ignore_missing_files=ignore_missing_files,
+                                 processes=processes)
+        errs = accumulator.errors()
+    else:
+        from . import yodaplot
+        y_coord_list = []
+        for file_name, rebin_count in zip(files, rebin_counts):
+            try:
+                data_object = yodaplot.resolve_data_object(file_name, rivet_path, rebin_count=rebin_count, rebin_begin=rebin_begin,
+                                                           as_histogram=True)
+                y_coord_list.append(yodaplot.get_y_coords(data_object))
+            except IOError:
+                if not ignore_missing_files:
+                    raise
+                else:
+                    _logger.warning("Ignore missing file %s", file_name)
+        errs = error_calc(np.array(y_coord_list))
+    return scatter_with_errors(files[0], rivet_path, errs,
+                               rebin_count=rebin_counts[0], rebin_begin=rebin_begin,
+                               as_histogram=as_histogram)
+
+def accumulate(files, rivet_path, error_calc, rebin_count=None, rebin_counts=None, rebin_begin=0,
+               ignore_missing_files=False, first_index=0, processes=None):
+    """Read files[i]/rivet_path one at a time into the accumulator for
+    error_calc and return it, where files[i] is taken to be the dataset with
+    the index first_index + i.
+
+    If processes is given, the files are distributed in contiguous chunks over
+    a pool of that many worker processes, and their accumulators are merged.
+    Accumulators that need the CV dataset to reduce their state (like the one
+    for asymmetric_hessian_error) also read files[0] in each worker, such that
+    their memory stays bounded.
+
+    Accumulators can also be stored with save_accumulator, such that combining
+    a large number of files can be split over several jobs, e.g. on a cluster,
+    and newly finished files can be added later on:
+
+    .. code-block:: python
+
+        accumulator = load_accumulator("shard0.npz")
+        accumulator.merge(accumulate(new_files, rivet_path, standard_error,
+                                     first_index=1000))
+        errs = accumulator.errors()
+    """
+    rebin_counts = _normalize_rebin_counts(files, rebin_count, rebin_counts)
+    if processes is None:
+        return _accumulate_chunk((files, rivet_path, error_calc, rebin_counts, rebin_begin,
+                                  ignore_missing_files, first_index, None))
+    import multiprocessing
+    chunk_size = max(1, -(-len(files) // (4 * processes)))
+    central = (files[0], rebin_counts[0]) if first_index == 0 else None
+    chunks = [(files[begin:begin + chunk_size], rivet_path, error_calc,
+               rebin_counts[begin:begin + chunk_size], rebin_begin,
+               ignore_missing_files, first_index + begin, central if begin > 0 else None)
+              for begin in range(0, len(files), chunk_size)]
+    pool = multiprocessing.Pool(processes)
+    try:
+        accumulators = pool.map(_accumulate_chunk, chunks)
+    finally:
+        pool.close()
+        pool.join()
+    return merge_accumulators(accumulators)
+
+def combine_many(files, rivet_paths, error_calc, rebin_counts=None, rebin_begin=0,
+                 uses_rivet_plot_info=True, ignore_missing_files=False, as_histogram=False):
+    """Combine several data objects like combine, but read each file only once
+    and return an OrderedDict that maps each rivet path to its scatter.
+
+    rivet_paths is either a list or "all" for all Histo1D and Scatter2D data
+    objects within files[0], except the auxiliary ones like reference data
+    (see :py:func:`heppyplotlib.yodaplot.histogram_names`).
+    rebin_counts optionally maps rivet paths to the number of bins to be merged,
+    the other paths use the rebin count from the Rivet plot info if
+    uses_rivet_plot_info is True and are not rebinned otherwise.
+
+    Like for combine, files can also be a replica archive, and the scatters
+    are YODA data objects unless as_histogram is True or YODA is not
+    installed.
+    """
+    from . import loader, replicastore, yodaplot
+    store = None
+    if _is_replica_store(files):
+        store = files if isinstance(files, replicastore.ReplicaStore) \
+            else replicastore.ReplicaStore(files)
+        if rivet_paths == "all":
+            rivet_paths = [rivet_path for rivet_path in store.rivet_paths
+                           if not yodaplot.is_auxiliary_rivet_path(rivet_path)]
+    elif rivet_paths == "all":
+        rivet_paths = yodaplot.histogram_names(files[0])
+    path_rebin_counts = {}
+    for rivet_path in rivet_paths:
+        if rebin_counts is not None and rivet_path in rebin_counts:
+            path_rebin_counts[rivet_path] = rebin_counts[rivet_path]
+        elif uses_rivet_plot_info:
+            from . import rivetplot
+            path_rebin_counts[rivet_path] = rivetplot.rebin_count(rivet_path)
+        else:
+            path_rebin_counts[rivet_path] = 1
+    if store is not None:
+        return OrderedDict((rivet_path, replicastore.combine(store, rivet_path, error_calc,
+                                                             path_rebin_counts[rivet_path],
+                                                             rebin_begin, as_histogram))
+                           for rivet_path in rivet_paths)
+    accumulators = OrderedDict((rivet_path, make_accumulator(error_calc))
+                               for rivet_path in rivet_paths)
+    for index, file_name in enumerate(files):
+        try:
+            data_objects = loader.read_histograms(file_name, rivet_paths)
+        except IOError:
+            if not ignore_missing_files:
+                raise
+            else:
+                _logger.warning("Ignore missing file %s", file_name)
+                continue
+        for rivet_path, data_object in data_objects.items():
+            data_object = yodaplot.resolve_data_object(data_object, rivet_path,
+                                                       rebin_count=path_rebin_counts[rivet_path],
+                                                       rebin_begin=rebin_begin,
+                                                       as_histogram=True)
+            accumulators[rivet_path].add(index, yodaplot.get_y_coords(data_object))
+    return OrderedDict((rivet_path, scatter_with_errors(files[0], rivet_path, accumulator.errors(),
+                                                        rebin_count=path_rebin_counts[rivet_path],
+                                                        rebin_begin=rebin_begin,
+                                                        as_histogram=as_histogram))
+                       for rivet_path, accumulator in accumulators.items())
+
+def scatter_with_errors(filename_or_data_object, rivet_path, errs, rebin_count=1, rebin_begin=0,
+                        as_histogram=False):
+    """Return a scatter version of a (CV) data object with its y errors
+    replaced by the given (2 x bins) errors, like combine does."""
+    from . import yodaplot
+    from .histogram import to_public
+    # make sure we are dealing with a scatter object to have the correct notion of errors
+    scatter = yodaplot.resolve_data_object(filename_or_data_object,
+        rivet_path, rebin_count=rebin_count, rebin_begin=rebin_begin,
+        as_histogram=True).to_scatter()
+    scatter.y_errs = np.array(errs, dtype=np.float64)
+    return to_public(scatter, as_histogram)
+
+def _is_replica_store(files):
+    from . import replicastore
+    return isinstance(files, (str, replicastore.ReplicaStore))
+
+def _normalize_rebin_counts(files, rebin_count, rebin_counts):
     if rebin_count is not None and rebin_counts is not None:
         raise Exception("Only use one of the options 'rebin_count' and 'rebin_counts'.")
     elif rebin_count is not None:
         rebin_counts = [rebin_count] * len(files)
     elif rebin_counts is None:
         rebin_counts = [1] * len(files)
-    import yoda
+    return rebin_counts
+
+def _accumulate_chunk(args):
+    (files, rivet_path, error_calc, rebin_counts, rebin_begin,
+     ignore_missing_files, first_index, central) = args
     from . import yodaplot
-    y_coord_list = []
-    for file_name, rebin_count in zip(files, rebin_counts):
+    accumulator = make_accumulator(error_calc)
+    if central is not None and getattr(accumulator, 'needs_central_value', False):
+        # reduce the datasets of this chunk right away, instead of keeping
+        # them until the accumulators are merged
+        data_object = yodaplot.resolve_data_object(central[0], rivet_path, rebin_count=central[1],
+                                                   rebin_begin=rebin_begin, as_histogram=True)
+        accumulator.add(0, yodaplot.get_y_coords(data_object))
+    for i, (file_name, rebin_count) in enumerate(zip(files, rebin_counts)):
         try:
-            data_object = yodaplot.resolve_data_object(file_name, rivet_path, rebin_count=rebin_count, rebin_begin=rebin_begin)
-            y_coord_list.append(yodaplot.get_y_coords(data_object))
+            data_object = yodaplot.resolve_data_object(file_name, rivet_path, rebin_count=rebin_count, rebin_begin=rebin_begin,
+                                                       as_histogram=True)
         except IOError:
             if not ignore_missing_files:
                 raise
             else:
-                print("Ignore missing file", file_name)
-    errs = error_calc(y_coord_list)
-    # make sure we are dealing with a scatter object to have the correct notion of errors
-    scatter = yoda.mkScatter(yodaplot.resolve_data_object(files[0],
-        rivet_path, rebin_count=rebin_counts[0], rebin_begin=rebin_begin))
-    for point, point_errs in zip(scatter.points, zip(*errs)):
-        point.yErrs = point_errs
-    return scatter
-
-def standard_error(value_lists):
-    """Calculate the standard error from a list of datasets,
-    where the first dataset stems from a CV run."""
-    negative_errs = []
-    positive_errs = []
-    transposed_value_lists = zip(*value_lists)
-    for values in transposed_value_lists:
-        replicas = values[1:]
-        central_value = np.mean(replicas)
-        sum_of_squared_deviations = 0.0
-        for replica in replicas:
-            sum_of_squared_deviations += (replica - central_value)**2
-        error = math.sqrt(sum_of_squared_deviations / (len(replicas) - 1))
-        negative_errs.append(error)
-        positive_errs.append(error)
-    return (negative_errs, positive_errs)
-
-def asymmetric_hessian_error(value_lists):
-    """Calculate the asymmetric hessian error from a list of datasets,
-    where the first dataset stems from a PDF CV run."""
-    negative_errs = []
-    positive_errs = []
-    transposed_value_lists = zip(*value_lists)
-    for values in transposed_value_lists:
-        central_value = values[0]
-        evs = values[1:]
-        error = [0.0, 0.0]
-        for i in range(0, len(evs), 2):
-            (ev_p, ev_m) = evs[i:i+2]
-            error[0] += max(central_value - ev_p, central_value - ev_m, 0)**2
-            error[1] += max(ev_p - central_value, ev_m - central_value, 0)**2
-        negative_errs.append(math.sqrt(error[0]))
-        positive_errs.append(math.sqrt(error[1]))
-    return (negative_errs, positive_errs)
-
-def envelope_error(value_lists):
-    """Calculate the envelope of a list of datasets.
+                _logger.warning("Ignore missing file %s", file_name)
+                continue
+        accumulator.add(first_index + i, yodaplot.get_y_coords(data_object))
+    return accumulator
+
+def standard_error(values):
+    """Calculate the standard error from a (datasets x bins) array,
+    where the first dataset stems from a CV run.
+
+    Like all error calculators, it returns the negative and positive errors
+    as a (2 x bins) array."""
+    replicas = np.asarray(values, dtype=np.float64)[1:]
+    error = np.std(replicas, axis=0, ddof=1)
+    return np.array([error, error])
+
+def asymmetric_hessian_error(values):
+    """Calculate the asymmetric hessian error from a (datasets x bins) array,
+    where the first dataset stems from a PDF CV run, followed by pairs of
+    eigenvector variations."""
+    values = np.asarray(values, dtype=np.float64)
+    central_value = values[0]
+    evs = values[1:]
+    if len(evs) % 2:
+        raise Exception("The eigenvector variations must come in pairs.")
+    deviations_p = evs[0::2] - central_value
+    deviations_m = evs[1::2] - central_value
+    negative_errs = np.sqrt(np.sum(np.maximum(-np.minimum(deviations_p, deviations_m), 0)**2, axis=0))
+    positive_errs = np.sqrt(np.sum(np.maximum(np.maximum(deviations_p, deviations_m), 0)**2, axis=0))
+    return np.array([negative_errs, positive_errs])
+
+def envelope_error(values):
+    """Calculate the envelope of a (datasets x bins) array.
     The returned "errors" are relative to the first dataset."""
-    negative_errs = []
-    positive_errs = []
-    transposed_value_lists = zip(*value_lists)
-    for values in transposed_value_lists:
-        negative_errs.append(values[0] - min(values))
-        positive_errs.append(max(values) - values[0])
-    return (negative_errs, positive_errs)
+    values = np.asarray(values, dtype=np.float64)
+    return np.array([values[0] - np.min(values, axis=0),
+                     np.max(values, axis=0) - values[0]])
+
+def make_accumulator(error_calc):
+    """Return an accumulator that calculates the same errors as error_calc,
+    but takes the datasets one at a time using its add(index, values) method.
+    Its errors() method then returns the (2 x bins) errors.
+
+    Accumulators of disjoint sets of datasets can be merged (in any order)
+    using their merge(other) method.
+
+    For error_calc functions other than the ones within this module, a
+    CollectingAccumulator is returned."""
+    accumulator_classes = {standard_error: StandardErrorAccumulator,
+                           asymmetric_hessian_error: AsymmetricHessianErrorAccumulator,
+                           envelope_error: EnvelopeErrorAccumulator}
+    try:
+        return accumulator_classes[error_calc]()
+    except KeyError:
+        return CollectingAccumulator(error_calc)
+
+def merge_accumulators(accumulators):
+    """Merge accumulators of disjoint sets of datasets into the first one and
+    return it."""
+    merged = accumulators[0]
+    for accumulator in accumulators[1:]:
+        merged.merge(accumulator)
+    return merged
+
+def save_accumulator(accumulator, filename):
+    """Write the state of an accumulator into a .npz file."""
+    np.savez(filename, kind=type(accumulator).__name__, **accumulator.state())
+
+def load_accumulator(filename):
+    """Read an accumulator that has been written using save_accumulator."""
+    accumulator_classes = {accumulator_class.__name__: accumulator_class
+                           for accumulator_class in (StandardErrorAccumulator,
+                                                     AsymmetricHessianErrorAccumulator,
+                                                     EnvelopeErrorAccumulator)}
+    with np.load(filename) as state:
+        state = dict(state)
+    kind = str(state.pop('kind'))
+    return accumulator_classes[kind].from_state(state)
+
+class CollectingAccumulator(object):
+    """Collects all datasets and passes them to an arbitrary error_calc
+    function. Its memory grows with the number of datasets, and it can not be
+    saved using save_accumulator."""
+
+    def __init__(self, error_calc):
+        self.error_calc = error_calc
+        self.values = {}
+
+    def add(self, index, values):
+        """Add the dataset with the given index."""
+        self.values[index] = np.asarray(values, dtype=np.float64)
+
+    def merge(self, other):
+        """Add the datasets of another accumulator."""
+        self.values.update(other.values)
+
+    def errors(self):
+        """Return the negative and positive errors."""
+        return self.error_calc(np.array([self.values[index] for index in sorted(self.values)]))
+
+class StandardErrorAccumulator(object):
+    """Accumulates the standard error using Welford's running mean and
+    variance of all datasets except the first (CV) one."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self.sum_of_squared_deviations = None
+
+    def add(self, index, values):
+        """Add the dataset with the given index."""
+        if index == 0:
+            return
+        values = np.asarray(values, dtype=np.float64)
+        if self.count == 0:
+            self.mean = np.zeros_like(values)
+            self.sum_of_squared_deviations = np.zeros_like(values)
+        self.count += 1
+        deviations = values - self.mean
+        self.mean += deviations / self.count
+        self.sum_of_squared_deviations += deviations * (values - self.mean)
+
+    def merge(self, other):
+        """Add the datasets of another accumulator (Chan et al.)."""
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count = other.count
+            self.mean = other.mean.copy()
+            self.sum_of_squared_deviations = other.sum_of_squared_deviations.copy()
+            return
+        count = self.count + other.count
+        deviations = other.mean - self.mean
+        self.mean += deviations * other.count / count
+        self.sum_of_squared_deviations += (other.sum_of_squared_deviations
+                                           + deviations**2 * self.count * other.count / count)
+        self.count = count
+
+    def errors(self):
+        """Return the negative and positive errors."""
+        error = np.sqrt(self.sum_of_squared_deviations / (self.count - 1))
+        return np.array([error, error])
+
+    def state(self):
+        """Return the state as a dict of arrays."""
+        state = {'count': np.array(self.count)}
+        if self.count:
+            state['mean'] = self.mean
+            state['sum_of_squared_deviations'] = self.sum_of_squared_deviations
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        """Create an accumulator from a state dict."""
+        accumulator = cls()
+        accumulator.count = int(state['count'])
+        accumulator.mean = state.get('mean')
+        accumulator.sum_of_squared_deviations = state.get('sum_of_squared_deviations')
+        return accumulator
+
+class AsymmetricHessianErrorAccumulator(object):
+    """Accumulates the asymmetric hessian error from running sums over the
+    pairs of eigenvector variations. Pairs are only summed as soon as both
+    members and the CV dataset have been added. Adding the CV dataset several
+    times, e.g. to the accumulators of several workers, is harmless."""
+
+    # without the CV dataset, all variations are kept until it is added
+    needs_central_value = True
+
+    def __init__(self):
+        self.central_value = None
+        self.pending = {}
+        self.sums_of_squares = None
+
+    def add(self, index, values):
+        """Add the dataset with the given index."""
+        values = np.asarray(values, dtype=np.float64)
+        if index == 0:
+            self.central_value = values
+        else:
+            pair, member = divmod(index - 1, 2)
+            self.pending.setdefault(pair, [None, None])[member] = values
+        self._sum_complete_pairs()
+
+    def merge(self, other):
+        """Add the datasets of another accumulator."""
+        if other.central_value is not None:
+            self.central_value = other.central_value
+        for pair, evs in other.pending.items():
+            pending_evs = self.pending.setdefault(pair, [None, None])
+            for member, values in enumerate(evs):
+                if values is not None:
+                    pending_evs[member] = values
+        if other.sums_of_squares is not None:
+            if self.sums_of_squares is None:
+                self.sums_of_squares = other.sums_of_squares.copy()
+            else:
+                self.sums_of_squares += other.sums_of_squares
+        self._sum_complete_pairs()
+
+    def errors(self):
+        """Return the negative and positive errors."""
+        if self.pending:
+            raise Exception("The eigenvector variations must come in pairs.")
+        if self.sums_of_squares is None:
+            return np.zeros((2, len(self.central_value)))
+        return np.sqrt(self.sums_of_squares)
+
+    def state(self):
+        """Return the state as a dict of arrays."""
+        state = {}
+        if self.central_value is not None:
+            state['central_value'] = self.central_value
+        if self.sums_of_squares is not None:
+            state['sums_of_squares'] = self.sums_of_squares
+        for pair, evs in self.pending.items():
+            for member, values in enumerate(evs):
+                if values is not None:
+                    state['pending_{}_{}'.format(pair, member)] = values
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        """Create an accumulator from a state dict."""
+        accumulator = cls()
+        accumulator.central_value = state.get('central_value')
+        accumulator.sums_of_squares = state.get('sums_of_squares')
+        for key, values in state.items():
+            if key.startswith('pending_'):
+                pair, member = [int(part) for part in key.split('_')[1:]]
+                accumulator.pending.setdefault(pair, [None, None])[member] = values
+        return accumulator
+
+    def _sum_complete_pairs(self):
+        if self.central_value is None:
+            return
+        for pair in [pair for pair, evs in self.pending.items()
+                     if evs[0] is not None and evs[1] is not None]:
+            deviations_p, deviations_m = np.array(self.pending.pop(pair)) - self.central_value
+            if self.sums_of_squares is None:
+                self.sums_of_squares = np.zeros((2, len(self.central_value)))
+            self.sums_of_squares[0] += np.maximum(-np.minimum(deviations_p, deviations_m), 0)**2
+            self.sums_of_squares[1] += np.maximum(np.maximum(deviations_p, deviations_m), 0)**2
+
+class EnvelopeErrorAccumulator(object):
+    """Accumulates the envelope using a running minimum and maximum."""
+
+    def __init__(self):
+        self.central_value = None
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, index, values):
+        """Add the dataset with the given index."""
+        values = np.asarray(values, dtype=np.float64)
+        if index == 0:
+            self.central_value = values
+        self._update_extrema(values, values)
+
+    def merge(self, other):
+        """Add the datasets of another accumulator."""
+        if other.central_value is not None:
+            self.central_value = other.central_value
+        if other.minimum is not None:
+            self._update_extrema(other.minimum, other.maximum)
+
+    def errors(self):
+        """Return the negative and positive errors."""
+        return np.array([self.central_value - self.minimum,
+                         self.maximum - self.central_value])
+
+    def state(self):
+        """Return the state as a dict of arrays."""
+        return {key: value for key, value in (('central_value', self.central_value),
+                                              ('minimum', self.minimum),
+                                              ('maximum', self.maximum))
+                if value is not None}
+
+    @classmethod
+    def from_state(cls, state):
+        """Create an accumulator from a state dict."""
+        accumulator = cls()
+        accumulator.central_value = state.get('central_value')
+        accumulator.minimum = state.get('minimum')
+        accumulator.maximum = state.get('maximum')
+        return accumulator
+
+    def _update_extrema(self, minimum, maximum):
+        if self.minimum is None:
+            self.minimum = np.array(minimum, dtype=np.float64)
+            self.maximum = np.array(maximum, dtype=np.float64)
+        else:
+            np.minimum(self.minimum, minimum, out=self.minimum)
+            np.maximum(self.maximum, maximum, out=self.maximum)
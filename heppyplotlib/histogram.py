@@ -0,0 +1,141 @@
+"""An array-backed representation of one-dimensional YODA data objects."""
+
+import numpy as np
+
+_has_yoda = None
+
+
+class Histogram(object):
+    """Binned data with its bins stored as float64 arrays.
+
+    x holds the bin positions and y the values. x_errs and y_errs have the shape
+    (2, number of bins) and hold the lower and upper errors. Histograms that
+    stem from a YODA Histo1D also keep the sums of weights (sumw) and of squared
+    weights (sumw2) of each bin, and their type is 'Histo1D'."""
+
+    def __init__(self, x, x_errs, y, y_errs, sumw=None, sumw2=None,
+                 path='', title='', type_name='Scatter2D'):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.x_errs = np.asarray(x_errs, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.y_errs = np.asarray(y_errs, dtype=np.float64)
+        self.sumw = None if sumw is None else np.asarray(sumw, dtype=np.float64)
+        self.sumw2 = None if sumw2 is None else np.asarray(sumw2, dtype=np.float64)
+        self.path = path
+        self.title = title
+        self.type = type_name
+
+    @classmethod
+    def from_bins(cls, x_lows, x_highs, sumw, sumw2, path='', title=''):
+        """Create a Histo1D-like histogram from its bin edges and weight sums."""
+        x_lows = np.asarray(x_lows, dtype=np.float64)
+        x_highs = np.asarray(x_highs, dtype=np.float64)
+        sumw = np.asarray(sumw, dtype=np.float64)
+        sumw2 = np.asarray(sumw2, dtype=np.float64)
+        widths = x_highs - x_lows
+        half_widths = widths / 2.0
+        y_err = np.sqrt(sumw2) / widths
+        return cls(x_lows + half_widths, np.array([half_widths, half_widths]),
+                   sumw / widths, np.array([y_err, y_err]),
+                   sumw=sumw, sumw2=sumw2,
+                   path=path, title=title, type_name='Histo1D')
+
+    @classmethod
+    def from_yoda(cls, data_object):
+        """Create a histogram from a YODA Histo1D or Scatter2D object."""
+        if isinstance(data_object, Histogram):
+            return data_object
+        if data_object.type == 'Histo1D':
+            columns = np.array([(histo_bin.xEdges()[0], histo_bin.xEdges()[1],
+                                 histo_bin.sumW(), histo_bin.sumW2())
+                                for histo_bin in data_object.bins()],
+                               dtype=np.float64).reshape(-1, 4).T
+            return cls.from_bins(*columns,
+                                 path=data_object.path, title=data_object.title)
+        elif data_object.type == 'Scatter2D':
+            columns = np.array([(point.x(), point.xErrs()[0], point.xErrs()[1],
+                                 point.y(), point.yErrs()[0], point.yErrs()[1])
+                                for point in data_object.points()],
+                               dtype=np.float64).reshape(-1, 6).T
+            return cls(columns[0], columns[1:3], columns[3], columns[4:6],
+                       path=data_object.path, title=data_object.title)
+        raise Exception('Unknown type of YODA data object: ', data_object)
+
+    def to_yoda(self):
+        """Return an equivalent YODA Histo1D or Scatter2D object."""
+        import yoda
+        if self.type == 'Histo1D':
+            x_lows, x_highs = self.x_lows, self.x_highs
+            if np.allclose(x_highs[:-1], x_lows[1:]):
+                # share the edges of adjacent bins to avoid rounding overlaps
+                edges = np.append(x_lows, x_highs[-1])
+                histo = yoda.Histo1D(list(edges), self.path, self.title)
+            else:
+                histo = yoda.Histo1D(self.path, self.title)
+                for x_low, x_high in zip(x_lows, x_highs):
+                    histo.addBin(x_low, x_high)
+            # a single fill with weight sumw2/sumw and fraction sumw**2/sumw2
+            # reproduces both sums exactly, this is all we need for plotting
+            for i, (sumw, sumw2) in enumerate(zip(self.sumw, self.sumw2)):
+                if sumw != 0.0 and sumw2 > 0.0:
+                    histo.fillBin(i, weight=sumw2 / sumw, fraction=sumw**2 / sumw2)
+                elif sumw2 > 0.0:
+                    weight = np.sqrt(sumw2 / 2.0)
+                    histo.fillBin(i, weight=weight)
+                    histo.fillBin(i, weight=-weight)
+            return histo
+        scatter = yoda.Scatter2D(path=self.path, title=self.title)
+        for x, x_errs, y, y_errs in zip(self.x, self.x_errs.T, self.y, self.y_errs.T):
+            scatter.addPoint(yoda.Point2D(x=x, y=y, xerrs=list(x_errs), yerrs=list(y_errs)))
+        return scatter
+
+    def clone(self):
+        """Return a deep copy."""
+        return Histogram(self.x.copy(), self.x_errs.copy(),
+                         self.y.copy(), self.y_errs.copy(),
+                         sumw=None if self.sumw is None else self.sumw.copy(),
+                         sumw2=None if self.sumw2 is None else self.sumw2.copy(),
+                         path=self.path, title=self.title, type_name=self.type)
+
+    def to_scatter(self):
+        """Return a Scatter2D-like copy, which does not keep the sums of
+        weights."""
+        return Histogram(self.x.copy(), self.x_errs.copy(),
+                         self.y.copy(), self.y_errs.copy(),
+                         path=self.path, title=self.title, type_name='Scatter2D')
+
+    def __len__(self):
+        return len(self.x)
+
+    @property
+    def x_lows(self):
+        """The lower bin edges."""
+        return self.x - self.x_errs[0]
+
+    @property
+    def x_highs(self):
+        """The upper bin edges."""
+        return self.x + self.x_errs[1]
+
+    @property
+    def widths(self):
+        """The bin widths."""
+        return self.x_errs[0] + self.x_errs[1]
+
+
+def to_public(histogram, as_histogram=False):
+    """Return a histogram the way the public functions of heppyplotlib return
+    data objects: as a YODA data object if the YODA bindings are installed,
+    unless as_histogram is True, and as the histogram itself otherwise."""
+    if as_histogram or not has_yoda():
+        return histogram
+    return histogram.to_yoda()
+
+
+def has_yoda():
+    """Return whether the YODA bindings are installed, without importing them."""
+    global _has_yoda
+    if _has_yoda is None:
+        import importlib.util
+        _has_yoda = importlib.util.find_spec('yoda') is not None
+    return _has_yoda
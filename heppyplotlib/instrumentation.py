@@ -0,0 +1,163 @@
+"""Record where heppyplotlib spends its time.
+
+Instrumentation is disabled by default, and then costs a single check per
+instrumented call. Once it is enabled, each call of an instrumented stage is
+recorded with its start time and duration:
+
+.. code-block:: python
+
+    from heppyplotlib import instrumentation
+    instrumentation.enable()
+    hpl.ratioplot(['LO.yoda', 'NLO.yoda'], '/ANALYSIS/HISTOGRAM')
+    print(instrumentation.statistics())
+    instrumentation.write_chrome_trace('trace.json')
+
+The stages are load (reading data objects from files), resolve (including the
+arithmetic), rebin, plot_info (looking up Rivet plot info), artists (creating
+or updating the artists of a data object) and savefig. Stages can be nested,
+e.g. resolve includes the load and rebin calls it makes, and the statistics of
+a stage include the time spent in its nested stages. The Chrome trace shows
+the nesting, and can be viewed with chrome://tracing or ui.perfetto.dev."""
+
+import functools
+import os
+import threading
+import time
+
+_enabled = False
+# (stage, start time since the epoch, duration, process id, thread id) tuples
+_events = []
+_lock = threading.Lock()
+
+
+def enable():
+    """Start recording the instrumented calls."""
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """Stop recording the instrumented calls, keeping the recorded ones."""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    """Return whether the instrumented calls are recorded."""
+    return _enabled
+
+
+def reset():
+    """Discard the recorded calls."""
+    with _lock:
+        del _events[:]
+
+
+def timed(stage):
+    """Return a context manager that records its duration as a call of
+    stage."""
+    if not _enabled:
+        return _NULL_TIMER
+    return _Timer(stage)
+
+
+def instrumented(stage):
+    """Decorate a function such that its calls are recorded as calls of
+    stage."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Timer(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def events():
+    """Return a list of the recorded calls as (stage, start, duration, process
+    id, thread id) tuples, with times in seconds."""
+    with _lock:
+        return list(_events)
+
+
+def take_events():
+    """Return the recorded calls like events, and discard them."""
+    with _lock:
+        taken_events = list(_events)
+        del _events[:]
+    return taken_events
+
+
+def add_events(new_events):
+    """Add calls that have been recorded elsewhere, e.g. in another process."""
+    with _lock:
+        _events.extend(tuple(event) for event in new_events)
+
+
+def statistics():
+    """Return a dict that maps each stage to its number of calls, and the
+    total, mean and maximum duration of its calls in seconds."""
+    stage_statistics = {}
+    for stage, _, duration, _, _ in events():
+        entry = stage_statistics.setdefault(stage, {'calls': 0, 'total': 0.0, 'max': 0.0})
+        entry['calls'] += 1
+        entry['total'] += duration
+        entry['max'] = max(entry['max'], duration)
+    for entry in stage_statistics.values():
+        entry['mean'] = entry['total'] / entry['calls']
+    return stage_statistics
+
+
+def write_json(filename):
+    """Write the statistics and the recorded calls as JSON."""
+    import json
+    with open(filename, 'w') as json_file:
+        json.dump({'statistics': statistics(),
+                   'events': [dict(zip(('stage', 'start', 'duration', 'pid', 'tid'), event))
+                              for event in events()]},
+                  json_file, indent=1)
+
+
+def write_chrome_trace(filename):
+    """Write the recorded calls in the Chrome trace event format."""
+    import json
+    trace_events = [{'name': stage, 'cat': 'heppyplotlib', 'ph': 'X',
+                     'ts': start * 1e6, 'dur': duration * 1e6, 'pid': pid, 'tid': tid}
+                    for stage, start, duration, pid, tid in events()]
+    with open(filename, 'w') as trace_file:
+        json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, trace_file)
+
+
+class _Timer(object):
+
+    __slots__ = ('stage', 'start', 'start_counter')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.time()
+        self.start_counter = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter() - self.start_counter
+        event = (self.stage, self.start, duration, os.getpid(), threading.get_ident())
+        with _lock:
+            _events.append(event)
+
+
+class _NullTimer(object):
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
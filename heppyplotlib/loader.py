@@ -0,0 +1,269 @@
+"""Load YODA files, keeping recently used files in a process-wide cache.
+
+Files are indexed by the byte offsets of their data object blocks (see
+:py:mod:`heppyplotlib.yodaindex`), and only the data objects that are actually
+requested are parsed. If the on-disk cache of :py:mod:`heppyplotlib.sidecar`
+is enabled, files are parsed at most once and later loaded from their array
+representation.
+
+Compressed files (.yoda.gz and .yoda.xz) are decompressed while reading them,
+without temporary files. As their blocks can not be read at an offset, only
+the part of the file up to the last requested data object is decompressed,
+and they are only indexed if all their data object names are needed.
+
+Files are parsed with the YODA bindings if they are installed, and with the
+NumPy-based parser of :py:mod:`heppyplotlib.yodatext` otherwise, which only
+supports Counter, Histo1D and Scatter2D objects. The parser can be chosen with
+set_parser or the HEPPYPLOTLIB_YODA_PARSER environment variable.
+
+Most of heppyplotlib works on the array representation of the data objects,
+which read_histograms returns. The cache can be used from several threads."""
+
+from collections import OrderedDict
+import io
+import os
+import threading
+
+from . import instrumentation, sidecar, yodaindex
+from .histogram import Histogram
+
+PARSERS = ('auto', 'yoda', 'numpy')
+
+_max_cached_files = 32
+_parser = os.environ.get('HEPPYPLOTLIB_YODA_PARSER', 'auto')
+_resolved_parser = None
+_persists_indices = False
+_cache = OrderedDict()
+_statistics = {'hits': 0, 'misses': 0}
+_lock = threading.RLock()
+
+
+@instrumentation.instrumented('load')
+def read_yoda(filename, names=None):
+    """Return an OrderedDict of data objects within a YODA file.
+
+    If names is None, all data objects are returned, otherwise only the named
+    ones are parsed. Parsed data objects are cached and reused as long as the
+    modification time and the size of the file are unchanged. The returned data
+    objects are shared between all callers, so clone them before modifying
+    them."""
+    with _lock:
+        entry = _cache_entry(filename)
+        names = _checked_names(filename, entry, names)
+        objects = entry['objects']
+        missing_names = [name for name in names if name not in objects]
+        _count(names, missing_names)
+        if missing_names and sidecar.is_enabled() and parser() == 'numpy':
+            # YODA data objects are parsed, as the sidecar only keeps the
+            # sums of weights of a Histo1D
+            histograms = _sidecar_histograms(filename, entry)
+            for name in missing_names:
+                if name in histograms and name not in objects:
+                    objects[name] = histograms[name]
+            missing_names = [name for name in missing_names if name not in objects]
+        if missing_names:
+            _parse(filename, entry, missing_names)
+        return OrderedDict((name, objects[name]) for name in names)
+
+
+@instrumentation.instrumented('load')
+def read_histograms(filename, names=None):
+    """Like read_yoda, but return the Histo1D and Scatter2D data objects as
+    (shared) :py:class:`heppyplotlib.histogram.Histogram` objects."""
+    with _lock:
+        entry = _cache_entry(filename)
+        names = _checked_names(filename, entry, names)
+        histograms = entry['histograms']
+        missing_names = [name for name in names if name not in histograms]
+        _count(names, missing_names)
+        if missing_names and sidecar.is_enabled():
+            _sidecar_histograms(filename, entry)
+            missing_names = [name for name in missing_names if name not in histograms]
+        if missing_names:
+            objects = entry['objects']
+            _parse(filename, entry, [name for name in missing_names if name not in objects])
+            for name in missing_names:
+                histograms[name] = Histogram.from_yoda(objects[name])
+        return OrderedDict((name, histograms[name]) for name in names)
+
+
+def load_data_object(filename, name):
+    """Return a single (shared) data object from a YODA file."""
+    return read_yoda(filename, [name])[name]
+
+
+def load_histogram(filename, name):
+    """Return a single (shared) Histogram from a YODA file."""
+    return read_histograms(filename, [name])[name]
+
+
+def object_types(filename):
+    """Return an OrderedDict mapping the data object names of a YODA file to
+    their type names, without parsing any data object."""
+    with _lock:
+        index = _index(filename, _cache_entry(filename))
+        return OrderedDict((name, entry[0]) for name, entry in index.items())
+
+
+def invalidate(filename=None):
+    """Remove a file from the cache, or all files if filename is None."""
+    with _lock:
+        if filename is None:
+            _cache.clear()
+            return
+        path = os.path.abspath(filename)
+        for key in [key for key in _cache if key[0] == path]:
+            del _cache[key]
+
+
+def set_cache_size(max_files):
+    """Set how many files are kept before the least recently used ones are
+    evicted."""
+    global _max_cached_files
+    with _lock:
+        _max_cached_files = max_files
+        _evict()
+
+
+def set_parser(name):
+    """Choose the parser for YODA files: 'yoda' for the YODA bindings, 'numpy'
+    for :py:mod:`heppyplotlib.yodatext`, or 'auto' for the bindings if they
+    are installed. The cache is cleared, as the parsers return different
+    types of data objects."""
+    global _parser, _resolved_parser
+    if name not in PARSERS:
+        raise ValueError("Unknown parser {!r}, use one of {}.".format(name, ", ".join(PARSERS)))
+    with _lock:
+        _parser = name
+        _resolved_parser = None
+        _cache.clear()
+
+
+def parser():
+    """Return the name of the parser that is used, 'yoda' or 'numpy'."""
+    global _resolved_parser
+    if _resolved_parser is None:
+        if _parser == 'auto':
+            import importlib.util
+            _resolved_parser = 'yoda' if importlib.util.find_spec('yoda') is not None \
+                else 'numpy'
+        else:
+            _resolved_parser = _parser
+    return _resolved_parser
+
+
+def set_index_persistence(enabled=True):
+    """Configure whether the byte-offset indices of YODA files are written
+    next to the files, such that later processes do not need to rescan
+    them."""
+    global _persists_indices
+    _persists_indices = enabled
+
+
+def cache_info():
+    """Return the data object cache hits and misses, and the current and
+    maximum number of cached files."""
+    with _lock:
+        return {'hits': _statistics['hits'],
+                'misses': _statistics['misses'],
+                'files': len(_cache),
+                'max_files': _max_cached_files}
+
+
+def reset_cache_info():
+    """Reset the hit and miss counters."""
+    with _lock:
+        _statistics['hits'] = 0
+        _statistics['misses'] = 0
+
+
+def _cache_entry(filename):
+    stat = os.stat(filename)
+    key = (os.path.abspath(filename), stat.st_mtime_ns, stat.st_size)
+    try:
+        entry = _cache[key]
+    except KeyError:
+        # drop entries for older versions of the same file
+        invalidate(filename)
+        # compressed files are indexed when needed, selective reads do not
+        # need to decompress them completely
+        index = None if yodaindex.is_compressed(filename) \
+            else yodaindex.load_index(filename, persist=_persists_indices)
+        entry = {'index': index,
+                 'objects': {},
+                 'histograms': {},
+                 'has_sidecar_histograms': False}
+        _cache[key] = entry
+        _evict()
+    else:
+        _cache.move_to_end(key)
+    return entry
+
+
+def _index(filename, entry):
+    if entry['index'] is None:
+        entry['index'] = yodaindex.load_index(filename, persist=_persists_indices)
+    return entry['index']
+
+
+def _checked_names(filename, entry, names):
+    if names is None:
+        return list(_index(filename, entry).keys())
+    index = entry['index']
+    if index is None:
+        # missing names are reported while reading the compressed blocks
+        return names
+    for name in names:
+        if name not in index:
+            raise KeyError("{} not found in {}".format(name, filename))
+    return names
+
+
+def _count(names, missing_names):
+    _statistics['hits'] += len(names) - len(missing_names)
+    _statistics['misses'] += len(missing_names)
+
+
+def _parse(filename, entry, names):
+    if not names:
+        return
+    text = yodaindex.read_blocks(filename, entry['index'], names)
+    if parser() == 'numpy':
+        from . import yodatext
+        entry['objects'].update(yodatext.parse(text))
+    else:
+        import yoda
+        entry['objects'].update(yoda.readYODA(io.StringIO(text)))
+
+
+def _sidecar_histograms(filename, entry):
+    histograms = entry['histograms']
+    if entry['has_sidecar_histograms']:
+        return histograms
+    digest = sidecar.content_hash(filename)
+    stored_histograms = sidecar.load(digest)
+    if stored_histograms is None:
+        if parser() == 'numpy':
+            from . import yodatext
+            data_objects = yodatext.read(filename)
+        else:
+            import yoda
+            if yodaindex.is_compressed(filename):
+                with yodaindex.open_yoda(filename) as yoda_file:
+                    text = yoda_file.read().decode('utf-8')
+                data_objects = yoda.readYODA(io.StringIO(text))
+            else:
+                data_objects = yoda.readYODA(filename)
+        entry['objects'].update(data_objects)
+        stored_histograms = OrderedDict((name, Histogram.from_yoda(data_object))
+                                        for name, data_object in data_objects.items()
+                                        if data_object.type in ('Histo1D', 'Scatter2D'))
+        sidecar.store(digest, stored_histograms)
+    histograms.update(stored_histograms)
+    entry['has_sidecar_histograms'] = True
+    return histograms
+
+
+def _evict():
+    while len(_cache) > max(_max_cached_files, 0):
+        _cache.popitem(last=False)
@@ -1,53 +1,120 @@
 """Functions for plotting data files."""
 
-from __future__ import print_function
+import logging
 
-import numpy as np
-import matplotlib.pyplot as plt
+from . import instrumentation
+
+_logger = logging.getLogger(__name__)
+
+
+def current_axes(axes=None):
+    """Return axes, or the current pyplot axes if axes is None.
+
+    All plotting functions take an axes argument. If it is given, they only
+    call methods of these axes and do not touch the global pyplot state, such
+    that independent figures can be plotted concurrently."""
+    if axes is None:
+        import matplotlib.pyplot as plt
+        return plt.gca()
+    return axes
 
 
 def rivet_paths(file_name):
-    """Return all :py:mod:`rivet` paths found at file_name."""
+    """Return the :py:mod:`rivet` paths of the data objects at file_name that
+    can be plotted, i.e. the Histo1D and Scatter2D ones except reference,
+    unscaled and internal data (see
+    :py:func:`heppyplotlib.yodaplot.histogram_names`)."""
     from . import yodaplot
-    return yodaplot.data_object_names(file_name)
+    return yodaplot.histogram_names(file_name)
 
 
-def gridplot(file_name, uses_rivet_plot_info=True):
+def gridplot(file_name, uses_rivet_plot_info=True, figure=None):
     """Convenience function to plot all :py:mod:`yoda` data objects
     from a :py:mod:`yoda` file into a subplots grid.
 
     :param str file_name: The path to the :py:mod:`yoda` file.
+    :param figure: The :py:class:`matplotlib.figure.Figure` to plot into, by
+        default a new pyplot figure is created.
     :return: fig, axes_list
     """
+    import numpy as np
+
     all_rivet_paths = rivet_paths(file_name)
 
     # setup axes
+    if figure is None:
+        import matplotlib.pyplot as plt
+        figure = plt.figure()
     if len(all_rivet_paths) == 1:
-        fig, axes_list = plt.subplots()
+        axes_list = figure.subplots()
     else:
         ncols = 2
-        nrows = (len(all_rivet_paths) - 1) / ncols + 1
-        fig, axes_list = plt.subplots(nrows, ncols, squeeze=False)
+        nrows = (len(all_rivet_paths) - 1) // ncols + 1
+        axes_list = figure.subplots(nrows, ncols, squeeze=False)
 
     # plot into axes
     for rivet_path, axes in zip(all_rivet_paths, np.ravel(axes_list)):
-        plt.sca(axes)
-        plot(file_name, rivet_path, uses_rivet_plot_info=uses_rivet_plot_info)
+        plot(file_name, rivet_path, uses_rivet_plot_info=uses_rivet_plot_info, axes=axes)
+
+    return figure, axes_list
 
-    return fig, axes_list
+
+def paged_gridplot(file_name, pdf, nrows=3, ncols=2, uses_rivet_plot_info=True,
+                   **fig_kwargs):
+    """Plot all :py:mod:`yoda` data objects from a :py:mod:`yoda` file into
+    subplots grids of fixed size, and write each grid as a page into a PDF.
+
+    Each page is written and released before the next one is plotted, such
+    that the memory usage does not grow with the number of data objects. The
+    pages are not registered with pyplot.
+
+    :param str file_name: The path to the :py:mod:`yoda` file.
+    :param pdf: The path to the PDF file, or an open
+        :py:class:`matplotlib.backends.backend_pdf.PdfPages` object.
+    :param fig_kwargs: Passed to :py:class:`matplotlib.figure.Figure` for each
+        page, e.g. figsize.
+    :return: The number of written pages.
+    """
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.figure import Figure
+
+    if not hasattr(pdf, 'savefig'):
+        with PdfPages(pdf) as pdf_pages:
+            return paged_gridplot(file_name, pdf_pages, nrows, ncols,
+                                  uses_rivet_plot_info, **fig_kwargs)
+
+    all_rivet_paths = rivet_paths(file_name)
+    plots_per_page = nrows * ncols
+    page_count = 0
+    for begin in range(0, len(all_rivet_paths), plots_per_page):
+        page_rivet_paths = all_rivet_paths[begin:begin + plots_per_page]
+        fig = Figure(**fig_kwargs)
+        axes_list = fig.subplots(nrows, ncols, squeeze=False)
+        for rivet_path, axes in zip(page_rivet_paths, axes_list.flat):
+            plot(file_name, rivet_path, uses_rivet_plot_info=uses_rivet_plot_info,
+                 axes=axes)
+        # leave the remainder of the last page blank
+        for axes in axes_list.flat[len(page_rivet_paths):]:
+            fig.delaxes(axes)
+        with instrumentation.timed('savefig'):
+            pdf.savefig(fig)
+        page_count += 1
+    return page_count
 
 
 def plot(filename_or_data_object, rivet_path,
-         uses_rivet_plot_info=True, errors_enabled=None,
+         uses_rivet_plot_info=True, errors_enabled=None, axes=None,
          **kwargs):
-    """Plot a :py:mod:`yoda` data object, potentially from a :py:mod:`yoda` file."""
+    """Plot a :py:mod:`yoda` data object, potentially from a :py:mod:`yoda` file.
+
+    The data object is plotted into axes, or into the current pyplot axes if
+    axes is None."""
     from . import yodaplot
 
-    print("Plotting", rivet_path, end="")
     if isinstance(filename_or_data_object, str):
-        print(" from", filename_or_data_object, "...")
+        _logger.info("Plotting %s from %s ...", rivet_path, filename_or_data_object)
     else:
-        print()
+        _logger.info("Plotting %s ...", rivet_path)
 
     if uses_rivet_plot_info and errors_enabled is None:
         from . import rivetplot
@@ -68,8 +135,9 @@ def plot(filename_or_data_object, rivet_path,
     result = yodaplot.plot(filename_or_data_object, rivet_path,
                            errors_enabled=errors_enabled,
                            rebin_count=rebin_count,
+                           axes=axes,
                            **kwargs)
     if uses_rivet_plot_info:
         from . import rivetplot
-        rivetplot.apply_plot_info(rivet_path)
+        rivetplot.apply_plot_info(rivet_path, axes)
     return result
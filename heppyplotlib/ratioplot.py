@@ -1,11 +1,12 @@
 """Plot a main pane with the nominal distribution and a lower pane with the
 ratio."""
 
-import matplotlib.pyplot as plt
-import matplotlib.gridspec as gridspec
-from matplotlib.ticker import MaxNLocator
+import logging
 
-from .plot import plot
+from . import instrumentation
+from .plot import current_axes, plot
+
+_logger = logging.getLogger(__name__)
 
 
 def ratioplot(files_or_data_objects, rivet_path,
@@ -15,6 +16,7 @@ def ratioplot(files_or_data_objects, rivet_path,
               uses_rivet_plot_info=True,
               errors_enabled=None,
               axes_list=None,
+              figure=None,
               draws_legend=True,
               legend_fraction_of_figure=None,
               labels=None,
@@ -26,18 +28,31 @@ def ratioplot(files_or_data_objects, rivet_path,
               squeeze=True,
               **kwargs):
     """Convenience function to plot data objects (directly passed or taken from
-    files) into a nominal pane and a diff pane"""
+    files) into a nominal pane and a diff pane
 
-    # if the user uses deviate_from, we ignore the default divide_by=0
-    if deviate_from is not None:
-        divide_by = None
+    The panes are either passed as axes_list, or they are created on figure.
+    If neither is given, a new pyplot figure is created. Only the methods of
+    the passed axes or figure are used, such that independent figures can be
+    plotted concurrently."""
+    from matplotlib.gridspec import GridSpec
 
     # we do not want to iterate characters, so wrap a passed string in a list
     if isinstance(files_or_data_objects, str):
         files_or_data_objects = [files_or_data_objects]
 
+    # resolve everything once, and share the results among all panes
+    nominals, diffs = resolve_ratioplot_data_objects(files_or_data_objects, rivet_path,
+                                                     divide_by=divide_by,
+                                                     deviate_from=deviate_from,
+                                                     assume_correlated=assume_correlated)
+    if labels is None:
+        labels = [default_label(filename_or_data_object)
+                  for filename_or_data_object in files_or_data_objects]
+
     if axes_list is None:
-        plt.figure()
+        if figure is None:
+            import matplotlib.pyplot as plt
+            figure = plt.figure()
         if nominal_height_ratio is None:
             if n_ratio_plots > 2:
                 nominal_height_ratio = 1
@@ -46,9 +61,9 @@ def ratioplot(files_or_data_objects, rivet_path,
         height_ratios = [nominal_height_ratio] + [1]*n_ratio_plots
         right = None if legend_fraction_of_figure is None else 1-legend_fraction_of_figure
         wspace = None if n_columns == 1 else 0.4
-        grid = gridspec.GridSpec(1 + n_ratio_plots, n_columns,
+        grid = GridSpec(1 + n_ratio_plots, n_columns, figure=figure,
                 height_ratios=height_ratios, right=right, hspace=0, wspace=wspace)
-        axes_column_list = ratioplot_setup_axes(grid)
+        axes_column_list = ratioplot_setup_axes(grid, figure)
     else:
         grid = None
         axes_column_list = [axes_list]
@@ -56,10 +71,9 @@ def ratioplot(files_or_data_objects, rivet_path,
     for i, axes_list in enumerate(axes_column_list):
 
         if axes_list[0] is not None:
-            plt.sca(axes_list[0])
-            plot_nominal(files_or_data_objects, rivet_path,
+            plot_nominal(nominals, rivet_path,
                          labels=labels, styles=styles,
-                         errors_enabled=errors_enabled, **kwargs)
+                         errors_enabled=errors_enabled, axes=axes_list[0], **kwargs)
 
             if draws_legend and len(files_or_data_objects) > 1:
                 if legend_fraction_of_figure is None:
@@ -68,35 +82,27 @@ def ratioplot(files_or_data_objects, rivet_path,
                         legend_loc_kwargs = rivetplot.legend_location_kwargs(rivet_path)
                     else:
                         legend_loc_kwargs = {'loc': 'best'}
-                    plt.legend(**legend_loc_kwargs)
+                    axes_list[0].legend(**legend_loc_kwargs)
                 else:
-                    handles, labels = axes_list[0].get_legend_handles_labels()
-                    plt.gcf().legend(handles, labels, loc="center right")
-
-        if isinstance(divide_by, int):
-            if not assume_correlated:
-                assume_correlated = divide_by
-            divide_by = files_or_data_objects[divide_by]
-        elif isinstance(deviate_from, int):
-            deviate_from = files_or_data_objects[deviate_from]
+                    handles, legend_labels = axes_list[0].get_legend_handles_labels()
+                    axes_list[0].figure.legend(handles, legend_labels, loc="center right")
 
         for diff in axes_list[1:]:
             if diff is not None:
-                plt.sca(diff)
-
-                plot_diff(files_or_data_objects, rivet_path,
-                          divide_by, deviate_from,
-                          assume_correlated=assume_correlated,
+                plot_diff(diffs, rivet_path, None, None,
                           styles=styles,
                           errors_enabled=errors_enabled,
+                          axes=diff,
                           **kwargs)
+                if deviate_from is not None:
+                    diff.set_ylim(-5, 5)
 
                 if i == 0 and uses_rivet_plot_info:
                     from . import rivetplot
                     rivetplot.apply_plot_info(rivet_path, axes_list[0], diff)
 
                 if i == 0 and diff_ylabel is not None:
-                    plt.ylabel(diff_ylabel)
+                    diff.set_ylabel(diff_ylabel)
 
     if n_columns == 1 and squeeze:
         return axes_list, grid
@@ -104,8 +110,233 @@ def ratioplot(files_or_data_objects, rivet_path,
         return axes_column_list, grid
 
 
-def ratioplot_setup_axes(subplot_specs):
-    """Returns a figure and two axes on it intended for main and diff plots."""
+class RatioplotTemplate(object):
+    """A ratio plot whose figure, grid and axes are created once and then
+    reused for any number of observables.
+
+    Each call of set_data updates the data of the existing artists in place
+    and reapplies labels, limits and scales, instead of creating new axes and
+    tick locators. The figure is not managed by pyplot, so labels from Rivet
+    plot info are rendered with LaTeX individually instead of through the
+    global pyplot settings. The layout is fixed to a single column with one
+    nominal and one ratio pane, use ratioplot for other layouts. Call close,
+    or use the template as a context manager, to release it::
+
+        with RatioplotTemplate(labels=['LO', 'NLO']) as template:
+            for rivet_path in rivet_paths:
+                template.set_data(['LO.yoda', 'NLO.yoda'], rivet_path)
+                template.savefig(rivet_path.strip('/').replace('/', '_') + '.pdf')
+
+    The remaining keyword arguments are used for plotting each data object,
+    like for ratioplot."""
+
+    def __init__(self, labels=None, styles=None, figure=None,
+                 nominal_height_ratio=2, draws_legend=True, diff_ylabel=None,
+                 **kwargs):
+        from matplotlib.figure import Figure
+        from matplotlib.gridspec import GridSpec
+        self.figure = Figure() if figure is None else figure
+        self.labels = labels
+        self.styles = styles
+        self.draws_legend = draws_legend
+        self.diff_ylabel = diff_ylabel
+        self.kwargs = kwargs
+        grid = GridSpec(2, 1, figure=self.figure,
+                        height_ratios=[nominal_height_ratio, 1], hspace=0)
+        self.axes_list = ratioplot_setup_axes(grid, self.figure)[0]
+        # the artists of each data object in the nominal and the diff pane
+        self._artists = [[], []]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def set_data(self, files_or_data_objects, rivet_path,
+                 divide_by=0,
+                 deviate_from=None,
+                 assume_correlated=False,
+                 uses_rivet_plot_info=True,
+                 errors_enabled=None):
+        """Show data objects (directly passed or taken from files), with the
+        same meaning of the arguments as for ratioplot."""
+        from . import rivetplot
+        if isinstance(files_or_data_objects, str):
+            files_or_data_objects = [files_or_data_objects]
+        errors_enabled = True if errors_enabled is None else errors_enabled
+
+        nominals, diffs = resolve_ratioplot_data_objects(files_or_data_objects, rivet_path,
+                                                         divide_by=divide_by,
+                                                         deviate_from=deviate_from,
+                                                         assume_correlated=assume_correlated)
+        if self.labels is not None:
+            labels = self.labels
+        else:
+            labels = [default_label(filename_or_data_object)
+                      for filename_or_data_object in files_or_data_objects]
+
+        main, diff = self.axes_list
+        for axes in self.axes_list:
+            # also resets the tick locators and formatters
+            axes.set_xscale('linear')
+            axes.set_yscale('linear')
+            axes.set_title('')
+            axes.set_xlabel('')
+            axes.set_ylabel('')
+            axes.set_autoscale_on(True)
+        self._update_pane(0, nominals, errors_enabled, labels)
+        self._update_pane(1, diffs, errors_enabled, None)
+
+        if self.draws_legend and len(files_or_data_objects) > 1:
+            if uses_rivet_plot_info:
+                legend_loc_kwargs = rivetplot.legend_location_kwargs(rivet_path)
+            else:
+                legend_loc_kwargs = {'loc': 'best'}
+            main.legend(**legend_loc_kwargs)
+        elif main.get_legend() is not None:
+            main.get_legend().remove()
+        if deviate_from is not None:
+            diff.set_ylim(-5, 5)
+        if uses_rivet_plot_info:
+            rivetplot.apply_plot_info(rivet_path, main, diff)
+        if self.diff_ylabel is not None:
+            diff.set_ylabel(self.diff_ylabel)
+        layout_axes_column(self.axes_list)
+
+    def savefig(self, *args, **kwargs):
+        """Save the figure, see matplotlib.figure.Figure.savefig."""
+        with instrumentation.timed('savefig'):
+            return self.figure.savefig(*args, **kwargs)
+
+    def close(self):
+        """Release the figure and its artists. The template can not be used
+        afterwards."""
+        if self.figure is None:
+            return
+        if getattr(self.figure.canvas, 'manager', None) is not None:
+            import matplotlib.pyplot as plt
+            plt.close(self.figure)
+        self.figure.clear()
+        self.figure = None
+        self.axes_list = None
+        self._artists = None
+
+    def _update_pane(self, pane, data_objects, errors_enabled, labels):
+        import matplotlib
+        from . import yodaplot
+        from .histogram import Histogram
+        colors = matplotlib.rcParams['axes.prop_cycle'].by_key()['color']
+        axes = self.axes_list[pane]
+        artists = self._artists[pane]
+        if not len(artists) == len(data_objects):
+            for data_object_artists in artists:
+                _remove_artists(data_object_artists)
+            artists[:] = [None] * len(data_objects)
+        for i, data_object in enumerate(data_objects):
+            histogram = Histogram.from_yoda(data_object)
+            label = None if labels is None else labels[i]
+            if not _update_steps(artists[i], histogram, errors_enabled, label,
+                                 self.kwargs.get('use_errorrects_for_legend', False)):
+                _remove_artists(artists[i])
+                kwargs = dict(self.kwargs)
+                if self.styles is not None:
+                    kwargs.update(self.styles[i])
+                # keep the colors stable when artists are recreated
+                kwargs.setdefault('color', colors[i % len(colors)])
+                if label is not None:
+                    kwargs['label'] = label
+                result = yodaplot.plot_data_object(histogram, errors_enabled, axes=axes,
+                                                   **kwargs)
+                # only step plots can be updated in place
+                artists[i] = result if _has_adjacent_bins(histogram) else _Fixed(result)
+        # relim ignores collections, i.e. the envelopes and the error bars
+        axes.relim()
+        for data_object_artists in artists:
+            _update_collection_datalim(axes, data_object_artists)
+        axes.autoscale_view()
+
+
+class _Fixed(object):
+    """Artists of a data object that can not be updated in place."""
+
+    def __init__(self, artists):
+        self.artists = artists
+
+
+def _has_adjacent_bins(histogram):
+    from . import yodaplot
+    if histogram.type == 'Histo1D':
+        return yodaplot.are_bins_adjacent(histogram.x_lows, histogram.widths)
+    return yodaplot.are_points_with_errors_adjacent(histogram.x, histogram.x_errs)
+
+
+@instrumentation.instrumented('artists')
+def _update_steps(artists, histogram, errors_enabled, label, uses_errorrects_for_legend):
+    """Update the artists of plot_step_with_errorbar in place, and return
+    whether this was possible."""
+    import numpy as np
+    from . import yodaplot
+    if not isinstance(artists, tuple) or not _has_adjacent_bins(histogram):
+        return False
+    steps, envelope = artists
+    if (envelope is not None) != errors_enabled:
+        return False
+    edges = np.append(histogram.x_lows, histogram.x_highs[-1])
+    steps[0].set_data(edges, np.append(histogram.y, histogram.y[-1]))
+    legend_artist = steps[0]
+    if envelope is not None:
+        y_errs = histogram.y_errs[0] if histogram.type == 'Histo1D' else histogram.y_errs
+        x_steps, y_down, y_up = yodaplot.errorrects_steps(edges, histogram.y, y_errs)
+        if isinstance(envelope, tuple):
+            envelope[0][0].set_data(x_steps, y_up)
+            envelope[1][0].set_data(x_steps, y_down)
+            envelope_legend_artist = envelope[0][0]
+        else:
+            envelope.set_verts([yodaplot.envelope_vertices(x_steps, y_down, y_up)])
+            envelope_legend_artist = envelope
+        if uses_errorrects_for_legend:
+            legend_artist = envelope_legend_artist
+    if label is not None:
+        legend_artist.set_label(label)
+    return True
+
+
+def _update_collection_datalim(axes, artists):
+    from matplotlib.collections import Collection, LineCollection
+    if isinstance(artists, _Fixed):
+        _update_collection_datalim(axes, artists.artists)
+    elif isinstance(artists, (list, tuple)):
+        # also the containers returned by errorbar and bar
+        for artist in artists:
+            _update_collection_datalim(axes, artist)
+    elif isinstance(artists, LineCollection):
+        for segment in artists.get_segments():
+            if len(segment):
+                axes.update_datalim(segment)
+    elif isinstance(artists, Collection):
+        for path in artists.get_paths():
+            axes.update_datalim(path.vertices)
+
+
+def _remove_artists(artists):
+    if isinstance(artists, _Fixed):
+        _remove_artists(artists.artists)
+    elif isinstance(artists, list) or type(artists) is tuple:
+        for artist in artists:
+            _remove_artists(artist)
+    elif artists is not None:
+        artists.remove()
+
+
+def ratioplot_setup_axes(subplot_specs, figure=None):
+    """Returns a figure and two axes on it intended for main and diff plots.
+
+    The axes are added to figure, or to the current pyplot figure if figure is
+    None."""
+    if figure is None:
+        import matplotlib.pyplot as plt
+        figure = plt.gcf()
     axes_column_list = []
     nrows = subplot_specs.get_geometry()[0]
     ncols = subplot_specs.get_geometry()[1]
@@ -114,12 +345,12 @@ def ratioplot_setup_axes(subplot_specs):
         kwargs = {}
         if not j == 0:
             kwargs["sharey"] = axes_column_list[0][0]
-        axes_list.append(plt.subplot(subplot_specs[j], **kwargs))
+        axes_list.append(figure.add_subplot(subplot_specs[j], **kwargs))
         for i in range(1, nrows):
-            kwargs = {"sharex": plt.subplot(subplot_specs[0])}
+            kwargs = {"sharex": axes_list[0] if j == 0 else axes_column_list[0][0]}
             #if not j == 0:
             #    kwargs["sharey"] = axes_column_list[0][i]
-            axes_list.append(plt.subplot(subplot_specs[i*ncols + j], **kwargs))
+            axes_list.append(figure.add_subplot(subplot_specs[i*ncols + j], **kwargs))
         layout_axes_column(axes_list)
         axes_column_list.append(axes_list)
     return axes_column_list
@@ -127,9 +358,10 @@ def ratioplot_setup_axes(subplot_specs):
 
 def layout_axes_column(axes):
     """Improves layout of a axes columns that are adjacent."""
+    from matplotlib.ticker import MaxNLocator
     for axis in axes[:-1]:
         axis.spines['bottom'].set_visible(False)
-        plt.setp(axis.get_xticklabels(), visible=False)
+        axis.tick_params(axis='x', labelbottom=False)
         axis.set_xlabel('')
     axes[-1].xaxis.tick_bottom()
     for axis in axes[1:]:
@@ -138,18 +370,56 @@ def layout_axes_column(axes):
                                                  prune='upper'))
 
 
+def resolve_ratioplot_data_objects(files_or_data_objects, rivet_path,
+                                   divide_by=0,
+                                   deviate_from=None,
+                                   assume_correlated=False):
+    """Return the nominal and the diff data objects of a ratio plot as two
+    lists of :py:class:`heppyplotlib.histogram.Histogram` objects, with the
+    same meaning of the arguments as for ratioplot.
+
+    Each file is loaded only once, and the diffs are calculated from the
+    nominal data objects. The reference is taken from the nominal data objects
+    if it is given as an index or as one of the files, and it is loaded only
+    once otherwise."""
+    from . import yodaplot
+    # if the user uses deviate_from, we ignore the default divide_by=0
+    if deviate_from is not None:
+        divide_by = None
+    if isinstance(divide_by, int) and not assume_correlated:
+        assume_correlated = divide_by
+    nominals = yodaplot.resolve_data_objects(files_or_data_objects, rivet_path)
+    divide_by = _shared_reference(divide_by, files_or_data_objects, nominals, rivet_path)
+    deviate_from = _shared_reference(deviate_from, files_or_data_objects, nominals, rivet_path)
+    diffs = yodaplot.resolve_data_objects(
+        nominals, rivet_path,
+        divide_by=divide_by, deviate_from=deviate_from,
+        assume_correlated=correlation_flags(assume_correlated, len(nominals)))
+    return nominals, diffs
+
+
+def _shared_reference(reference, files_or_data_objects, nominals, rivet_path):
+    from . import yodaplot
+    if reference is None or isinstance(reference, float):
+        return reference
+    if isinstance(reference, int):
+        return nominals[reference]
+    for filename_or_data_object, nominal in zip(files_or_data_objects, nominals):
+        if filename_or_data_object is reference or (
+                isinstance(reference, str) and filename_or_data_object == reference):
+            return nominal
+    return yodaplot.load_histogram(reference, rivet_path)
+
+
 def plot_nominal(files_or_data_objects, rivet_path,
                  errors_enabled=None, styles=None,
-                 labels=None, **kwargs):
+                 labels=None, axes=None, **kwargs):
     """Populate the upper (nominal) pane of a ratio plot."""
     for i, filename_or_data_object in enumerate(files_or_data_objects):
         if labels is not None:
             label = labels[i]
         else:
-            try:
-                label = filename_or_data_object.replace('_', r'\_')
-            except AttributeError:
-                label = filename_or_data_object.path.replace('_', r'\_')
+            label = default_label(filename_or_data_object)
         local_kwargs = dict(kwargs)
         if styles is not None:
             local_kwargs.update(styles[i])
@@ -157,33 +427,56 @@ def plot_nominal(files_or_data_objects, rivet_path,
              uses_rivet_plot_info=False,
              errors_enabled=errors_enabled,
              label=label,
+             axes=axes,
              **local_kwargs)
 
 
-def plot_diff(files_or_data_objects, rivet_path, divide_by, deviate_from, assume_correlated="all", styles=None, errors_enabled=None, **kwargs):
+def plot_diff(files_or_data_objects, rivet_path, divide_by, deviate_from, assume_correlated="all", styles=None, errors_enabled=None, axes=None, **kwargs):
     """Populate the lower (diff) pane of a ratio plot."""
     from . import yodaplot
-    for i, filename_or_data_object in enumerate(files_or_data_objects):
-        if isinstance(assume_correlated, bool):
-            assume_correlated_i = assume_correlated
-        elif isinstance(assume_correlated, int) and assume_correlated == i:
-            assume_correlated_i = True
-        elif isinstance(assume_correlated, str) and assume_correlated == "all":
-            assume_correlated_i = True
-        else:
-            assume_correlated_i = assume_correlated
-        print(assume_correlated_i)
-        data_object = yodaplot.resolve_data_object(filename_or_data_object,
-                                                   rivet_path,
-                                                   divide_by=divide_by,
-                                                   deviate_from=deviate_from,
-                                                   assume_correlated=assume_correlated_i)
+    axes = current_axes(axes)
+    assume_correlated_list = correlation_flags(assume_correlated, len(files_or_data_objects))
+    _logger.debug("Correlation flags of the diffs of %s: %s", rivet_path, assume_correlated_list)
+    # resolve all diffs at once, such that the reference is only loaded once
+    data_objects = yodaplot.resolve_data_objects(files_or_data_objects,
+                                                 rivet_path,
+                                                 divide_by=divide_by,
+                                                 deviate_from=deviate_from,
+                                                 assume_correlated=assume_correlated_list)
+    for i, data_object in enumerate(data_objects):
         local_kwargs = dict(kwargs)
         if styles is not None:
             local_kwargs.update(styles[i])
         plot(data_object, rivet_path,
              uses_rivet_plot_info=False,
              errors_enabled=errors_enabled,
+             axes=axes,
              **local_kwargs)
         if deviate_from is not None:
-            plt.gca().set_ylim(-5, 5)
+            axes.set_ylim(-5, 5)
+
+
+def default_label(filename_or_data_object):
+    """Returns the legend label for a file or data object, which is escaped
+    for LaTeX."""
+    try:
+        return filename_or_data_object.replace('_', r'\_')
+    except AttributeError:
+        return filename_or_data_object.path.replace('_', r'\_')
+
+
+def correlation_flags(assume_correlated, count):
+    """Returns for each of count data objects whether it is assumed to be
+    correlated with the reference. assume_correlated is a bool for all data
+    objects, the index of the only correlated data object, or "all"."""
+    flags = []
+    for i in range(count):
+        if isinstance(assume_correlated, bool):
+            flags.append(assume_correlated)
+        elif isinstance(assume_correlated, int):
+            flags.append(assume_correlated == i)
+        elif isinstance(assume_correlated, str) and assume_correlated == "all":
+            flags.append(True)
+        else:
+            flags.append(assume_correlated)
+    return flags
@@ -0,0 +1,135 @@
+"""Rebin histograms using bin-merge maps, which are calculated once per binning
+and can then be applied to any number of data objects sharing that binning."""
+
+from collections import OrderedDict
+
+import numpy as np
+
+from .histogram import Histogram
+
+_max_cached_maps = 64
+_cached_maps = OrderedDict()
+
+
+class RebinMap(object):
+    """Describes how the bins of a binning are merged.
+
+    The bins begin:end of the original binning are kept, and starts holds the
+    index of the first of these bins for each new bin, as used by
+    np.add.reduceat. x_lows and x_highs are the edges of the new bins."""
+
+    def __init__(self, nbins, begin, end, starts, x_lows, x_highs):
+        self.nbins = nbins
+        self.begin = begin
+        self.end = end
+        self.starts = starts
+        self.x_lows = x_lows
+        self.x_highs = x_highs
+
+    def __len__(self):
+        return len(self.starts)
+
+
+def rebin_map(x_lows, x_highs, rebin_count=1, rebin_begin=0, edges=None):
+    """Return the RebinMap for merging rebin_count consecutive bins, starting
+    with the bin rebin_begin, or for merging bins into new bins with the given
+    edges, which must coincide with edges of the original binning.
+
+    As for YODA's Histo1D.rebin, the bins before rebin_begin are kept as they
+    are, and the last new bin might merge less than rebin_count bins."""
+    x_lows = np.asarray(x_lows, dtype=np.float64)
+    x_highs = np.asarray(x_highs, dtype=np.float64)
+    nbins = len(x_lows)
+    if edges is None:
+        begin, end = 0, nbins
+        starts = np.concatenate([np.arange(0, min(rebin_begin, nbins)),
+                                 np.arange(rebin_begin, nbins, rebin_count)]).astype(np.intp)
+    else:
+        old_edges = np.append(x_lows, x_highs[-1])
+        # like are_points_with_errors_adjacent, allow deviations of 1% of the
+        # neighbouring bin widths, because YODA writes only 6 digits
+        widths = x_highs - x_lows
+        tolerances = np.minimum(np.append(widths, widths[-1]),
+                                np.insert(widths, 0, widths[0])) / 100.0
+        edge_indices = []
+        for edge in edges:
+            deviations = np.abs(old_edges - edge)
+            index = np.argmin(deviations)
+            if not deviations[index] <= tolerances[index]:
+                raise Exception("The new bin edge {} is not an edge of the binning.".format(edge))
+            edge_indices.append(index)
+        edge_indices = np.array(edge_indices, dtype=np.intp)
+        if np.any(np.diff(edge_indices) <= 0):
+            raise Exception("The new bin edges must be increasing.")
+        begin, end = edge_indices[0], edge_indices[-1]
+        starts = edge_indices[:-1] - begin
+    if np.any(np.diff(np.append(starts, end - begin)) > 1):
+        # merging requires adjacent bins
+        kept_lows = x_lows[begin:end]
+        kept_highs = x_highs[begin:end]
+        kept_half_widths = (kept_highs - kept_lows) / 2.0
+        if np.any(np.abs(kept_lows[1:] - kept_highs[:-1])
+                  > (kept_half_widths[:-1] + kept_half_widths[1:]) / 100.0):
+            raise Exception("Bins must be adjacent for merging them")
+    ends = np.append(starts[1:], end - begin) - 1
+    return RebinMap(nbins, begin, end, starts,
+                    x_lows[begin:end][starts], x_highs[begin:end][ends])
+
+
+def cached_rebin_map(x_lows, x_highs, rebin_count=1, rebin_begin=0):
+    """Return the RebinMap for merging rebin_count consecutive bins like
+    rebin_map, reusing maps calculated before for the same binning."""
+    x_lows = np.asarray(x_lows, dtype=np.float64)
+    x_highs = np.asarray(x_highs, dtype=np.float64)
+    key = (x_lows.tobytes(), x_highs.tobytes(), rebin_count, rebin_begin)
+    try:
+        _cached_maps.move_to_end(key)
+        return _cached_maps[key]
+    except KeyError:
+        pass
+    bin_map = rebin_map(x_lows, x_highs, rebin_count, rebin_begin)
+    _cached_maps[key] = bin_map
+    while len(_cached_maps) > _max_cached_maps:
+        _cached_maps.popitem(last=False)
+    return bin_map
+
+
+def rebin_means(bin_map, y, widths):
+    """Rebin values with the shape (..., bins), given the widths of the
+    original bins, by averaging them weighted with the bin widths."""
+    selection = slice(bin_map.begin, bin_map.end)
+    widths = np.asarray(widths, dtype=np.float64)[selection]
+    areas = np.add.reduceat(np.asarray(y)[..., selection] * widths, bin_map.starts, axis=-1)
+    return areas / (bin_map.x_highs - bin_map.x_lows)
+
+
+def rebin_values(bin_map, y, y_errs, widths):
+    """Rebin values with the shape (..., bins) and their errors with the shape
+    (..., 2, bins), given the widths of the original bins.
+
+    The values are averaged weighted with the bin widths, and the errors are
+    added in quadrature, i.e. they are treated as statistical errors."""
+    selection = slice(bin_map.begin, bin_map.end)
+    new_widths = bin_map.x_highs - bin_map.x_lows
+    squared_err_areas = np.add.reduceat(
+        (np.asarray(y_errs)[..., selection] * np.asarray(widths, dtype=np.float64)[selection])**2,
+        bin_map.starts, axis=-1)
+    return rebin_means(bin_map, y, widths), np.sqrt(squared_err_areas) / new_widths
+
+
+def rebin(bin_map, histogram):
+    """Return a rebinned copy of a histogram."""
+    if not len(histogram) == bin_map.nbins:
+        raise Exception("The rebin map is for {} bins, but the histogram has {}.".format(
+            bin_map.nbins, len(histogram)))
+    if histogram.sumw is not None:
+        selection = slice(bin_map.begin, bin_map.end)
+        return Histogram.from_bins(bin_map.x_lows, bin_map.x_highs,
+                                   np.add.reduceat(histogram.sumw[selection], bin_map.starts),
+                                   np.add.reduceat(histogram.sumw2[selection], bin_map.starts),
+                                   path=histogram.path, title=histogram.title)
+    y, y_errs = rebin_values(bin_map, histogram.y, histogram.y_errs, histogram.widths)
+    half_widths = (bin_map.x_highs - bin_map.x_lows) / 2.0
+    return Histogram(bin_map.x_lows + half_widths, np.array([half_widths, half_widths]),
+                     y, y_errs, path=histogram.path, title=histogram.title,
+                     type_name=histogram.type)
@@ -0,0 +1,227 @@
+"""Pack the data objects of a set of replica YODA files, e.g. the members of
+a PDF or the scale variations of a run, into a single archive, from which the
+values of all replicas of a data object are read as one contiguous block.
+
+An archive holds one (replicas x bins) block of y values per data object,
+stored with float64 or float32 precision, and the bins of the data object in
+the first (central) replica, which are always stored with float64 precision.
+It starts with a magic string, the length of its JSON header and the header
+itself, followed by the blocks, which are aligned such that they can be
+memory mapped and used as NumPy arrays without copying them:
+
+.. code-block:: python
+
+    from heppyplotlib import errorcalc, replicastore
+    replicastore.pack(['cv.yoda', 'rep1.yoda', 'rep2.yoda'], 'pdf.replicas')
+    scatter = errorcalc.combine('pdf.replicas', '/ANALYSIS/HISTOGRAM',
+                                errorcalc.standard_error)
+
+Archives are written to a temporary file first and then moved into place.
+"""
+
+import json
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+from . import loader, rebinning
+from .histogram import Histogram, to_public
+
+FORMAT_VERSION = 1
+MAGIC = b'HPLREPLICAS\0'
+
+# the per-bin columns of the central data objects, like in the sidecar cache
+_COLUMNS = ('x', 'xerr-', 'xerr+', 'y', 'yerr-', 'yerr+', 'sumw', 'sumw2')
+_ALIGNMENT = 64
+_DTYPES = {'float64': np.float64, 'float32': np.float32}
+
+
+def pack(files, filename, rivet_paths=None, dtype=np.float64):
+    """Write the data objects of replica files into an archive, where files[0]
+    is the central replica.
+
+    By default, all Histo1D and Scatter2D objects of the central replica are
+    packed, except the auxiliary ones like reference data. They must be found with the same number of bins in all files. The
+    files are read one at a time, so the memory usage does not depend on the
+    number of replicas. Return the number of packed data objects."""
+    dtype_name = np.dtype(dtype).name
+    if dtype_name not in _DTYPES:
+        raise ValueError("The values can only be stored as float64 or float32.")
+    if rivet_paths is None:
+        from . import yodaplot
+        rivet_paths = yodaplot.histogram_names(files[0])
+    centrals = loader.read_histograms(files[0], rivet_paths)
+
+    objects = []
+    offset = 0
+    for rivet_path, central in centrals.items():
+        nbins = len(central)
+        central_offset = offset
+        offset = _aligned(offset + len(_COLUMNS) * nbins * 8)
+        objects.append({'name': rivet_path, 'path': central.path, 'title': central.title,
+                        'type': central.type, 'bins': nbins,
+                        'central_offset': central_offset, 'values_offset': offset})
+        offset = _aligned(offset + len(files) * nbins * np.dtype(dtype_name).itemsize)
+    header = json.dumps({'version': FORMAT_VERSION, 'dtype': dtype_name,
+                         'files': [os.path.abspath(name) for name in files],
+                         'objects': objects}).encode('utf-8')
+    data_offset = _aligned(len(MAGIC) + 8 + len(header))
+
+    handle, temporary_filename = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)),
+                                                  suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as archive:
+            archive.write(MAGIC + struct.pack('<Q', len(header)) + header)
+            archive.truncate(data_offset + offset)
+        data = np.memmap(temporary_filename, dtype=np.uint8, mode='r+',
+                         offset=data_offset, shape=(offset,))
+        for entry in objects:
+            _central_block(data, entry)[:] = _central_columns(centrals[entry['name']])
+        for replica, replica_file in enumerate(files):
+            histograms = centrals if replica == 0 else loader.read_histograms(replica_file,
+                                                                              rivet_paths)
+            for entry in objects:
+                y = histograms[entry['name']].y
+                if not len(y) == entry['bins']:
+                    raise Exception("{} has {} bins in {}, but {} in {}.".format(
+                        entry['name'], len(y), replica_file, entry['bins'], files[0]))
+                _values_block(data, entry, dtype_name, len(files))[replica] = y
+            if replica > 0:
+                # replica files are read only once, do not let them fill the cache
+                loader.invalidate(replica_file)
+        data.flush()
+        del data
+        os.replace(temporary_filename, filename)
+    except Exception:
+        try:
+            os.remove(temporary_filename)
+        except OSError:
+            pass
+        raise
+    return len(objects)
+
+
+def is_archive(filename):
+    """Return whether a file is a replica archive."""
+    try:
+        with open(filename, 'rb') as archive:
+            return archive.read(len(MAGIC)) == MAGIC
+    except (IOError, OSError):
+        return False
+
+
+class ReplicaStore(object):
+    """A replica archive, which is memory mapped. The arrays it returns are
+    read-only views into the archive, and only valid as long as the store is
+    open."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as archive:
+            if not archive.read(len(MAGIC)) == MAGIC:
+                raise Exception("{} is not a replica archive.".format(filename))
+            header_size, = struct.unpack('<Q', archive.read(8))
+            header = json.loads(archive.read(header_size).decode('utf-8'))
+        if not header['version'] == FORMAT_VERSION:
+            raise Exception("{} has the unsupported format version {}.".format(
+                filename, header['version']))
+        self.files = header['files']
+        self.dtype = _DTYPES[header['dtype']]
+        self._objects = {entry['name']: entry for entry in header['objects']}
+        self._names = [entry['name'] for entry in header['objects']]
+        self._data = np.memmap(filename, dtype=np.uint8, mode='r',
+                               offset=_aligned(len(MAGIC) + 8 + header_size))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.files)
+
+    @property
+    def rivet_paths(self):
+        """The names of the packed data objects."""
+        return list(self._names)
+
+    def values(self, rivet_path):
+        """Return the (replicas x bins) y values of a data object."""
+        return _values_block(self._data, self._entry(rivet_path),
+                             np.dtype(self.dtype).name, len(self.files))
+
+    def central(self, rivet_path):
+        """Return the data object of the central replica as a Histogram, whose
+        arrays are views into the archive."""
+        entry = self._entry(rivet_path)
+        rows = _central_block(self._data, entry)
+        if entry['type'] == 'Histo1D':
+            sumw, sumw2 = rows[6], rows[7]
+        else:
+            sumw, sumw2 = None, None
+        return Histogram(rows[0], rows[1:3], rows[3], rows[4:6], sumw=sumw, sumw2=sumw2,
+                         path=entry['path'], title=entry['title'], type_name=entry['type'])
+
+    def close(self):
+        """Release the memory map."""
+        self._data = None
+
+    def _entry(self, rivet_path):
+        try:
+            return self._objects[rivet_path]
+        except KeyError:
+            raise KeyError("{} not found in {}".format(rivet_path, self.filename))
+
+
+def combine(store, rivet_path, error_calc, rebin_count=1, rebin_begin=0, as_histogram=False):
+    """Like :py:func:`heppyplotlib.errorcalc.combine`, but for the replicas of
+    a ReplicaStore or of the archive with the given file name."""
+    if not isinstance(store, ReplicaStore):
+        with ReplicaStore(store) as opened_store:
+            return combine(opened_store, rivet_path, error_calc, rebin_count, rebin_begin,
+                           as_histogram)
+    from . import yodaplot
+    values = store.values(rivet_path)
+    central = store.central(rivet_path)
+    if rebin_count is not None and rebin_count != 1:
+        bin_map = rebinning.cached_rebin_map(central.x_lows, central.x_highs,
+                                             rebin_count, rebin_begin)
+        values = rebinning.rebin_means(bin_map, values, central.widths)
+    scatter = yodaplot.resolve_data_object(central, rivet_path, rebin_count=rebin_count or 1,
+                                           rebin_begin=rebin_begin, as_histogram=True).to_scatter()
+    scatter.y_errs = np.array(error_calc(values), dtype=np.float64)
+    return to_public(scatter, as_histogram)
+
+
+def _aligned(offset):
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def _central_columns(histogram):
+    columns = np.empty((len(_COLUMNS), len(histogram)), dtype=np.float64)
+    columns[0] = histogram.x
+    columns[1:3] = histogram.x_errs
+    columns[3] = histogram.y
+    columns[4:6] = histogram.y_errs
+    if histogram.sumw is None:
+        columns[6:8] = np.nan
+    else:
+        columns[6] = histogram.sumw
+        columns[7] = histogram.sumw2
+    return columns
+
+
+def _central_block(data, entry):
+    begin = entry['central_offset']
+    size = len(_COLUMNS) * entry['bins'] * 8
+    return data[begin:begin + size].view(np.float64).reshape(len(_COLUMNS), entry['bins'])
+
+
+def _values_block(data, entry, dtype_name, replica_count):
+    dtype = np.dtype(dtype_name)
+    begin = entry['values_offset']
+    size = replica_count * entry['bins'] * dtype.itemsize
+    return data[begin:begin + size].view(dtype).reshape(replica_count, entry['bins'])
@@ -1,12 +1,58 @@
 """Functions for plotting data objects within YODA files with Rivet plot info."""
 
-from pprint import pprint
+import functools
+import logging
+import os
+import re
 
-import matplotlib.pyplot as plt
-from matplotlib.ticker import MultipleLocator, MaxNLocator, NullLocator
-import rivet
+from . import configuration, instrumentation
+from .plot import current_axes
 
-from . import configuration
+_plot_parser = None
+_plot_info_cache = {}
+# the PLOT sections of each .plot file, with its modification time
+_plot_file_cache = {}
+_logger = logging.getLogger(__name__)
+
+# translations of the LaTeX macros of Rivet labels (from the hepnames and
+# siunitx packages) that mathtext does not know
+_MACRO = re.compile(r'\\([A-Za-z]+)')
+_TEXT_TOKEN = re.compile(r'\\([A-Za-z]+)|\\([%&#_{}$ ])|([{}])|(~)')
+_MATH_DELIMITER = re.compile(r'(?<!\\)\$')
+_UNITS = frozenset(['eV', 'keV', 'MeV', 'GeV', 'TeV', 'ab', 'fb', 'pb', 'nb', 'mb'])
+_SI_UNIT = re.compile(r'\\(?:si|unit)(?:\[[^\]]*\])?\{([^{}]*)\}')
+_SI_QUANTITY = re.compile(r'\\(?:SI|qty)(?:\[[^\]]*\])?\{([^{}]*)\}\{([^{}]*)\}')
+_SI_TOKEN = re.compile(r'\\([A-Za-z]+)|\s+|(.)')
+_SI_PREFIXES = {'atto': 'a', 'femto': 'f', 'pico': 'p', 'nano': 'n', 'micro': '\u00b5',
+                'milli': 'm', 'centi': 'c', 'kilo': 'k', 'mega': 'M', 'giga': 'G',
+                'tera': 'T', 'peta': 'P'}
+_SI_UNITS = {'barn': 'b', 'electronvolt': 'eV', 'metre': 'm', 'meter': 'm', 'second': 's',
+             'gram': 'g', 'radian': 'rad', 'steradian': 'sr', 'degree': '\u00b0',
+             'percent': '%'}
+_SI_POWERS = {'squared': '\u00b2', 'cubed': '\u00b3'}
+_SI_POWER_PREFIXES = {'square': '\u00b2', 'cubic': '\u00b3'}
+_PARTICLES = {'PZ': 'Z', 'PW': 'W', 'PWp': 'W^+', 'PWm': 'W^-', 'PWpm': r'W^\pm',
+              'PH': 'H', 'Phiggs': 'H', 'Pphoton': r'\gamma', 'Pgg': r'\gamma',
+              'Pgluon': 'g', 'Pg': 'g', 'Pquark': 'q', 'Pq': 'q', 'Pqb': 'b', 'Pqt': 't',
+              'Pbottom': 'b', 'Ptop': 't', 'Pelectron': 'e', 'Pe': 'e', 'Pem': 'e^-',
+              'Pep': 'e^+', 'Ppositron': 'e^+', 'Pmuon': r'\mu', 'Pgm': r'\mu',
+              'Pgmm': r'\mu^-', 'Pgmp': r'\mu^+', 'Ptau': r'\tau', 'Pgt': r'\tau',
+              'Pnu': r'\nu', 'Pgn': r'\nu', 'Plepton': r'\ell', 'Pl': r'\ell',
+              'Pgp': r'\pi', 'PJgy': r'J/\psi'}
+_MATH_FONTS = {'text': 'mathrm', 'textrm': 'mathrm', 'textnormal': 'mathrm',
+               'textup': 'mathrm', 'mbox': 'mathrm',
+               'textbf': 'mathbf', 'textit': 'mathit', 'emph': 'mathit',
+               'textsf': 'mathsf', 'texttt': 'mathtt'}
+# the syntax of .plot files, like in rivet.plotinfo
+_PLOT_BEGIN = re.compile(r'^(?:#*\s*)?BEGIN (\w+) ?(\S+)?')
+_PLOT_END = re.compile(r'^(?:#*\s*)?END PLOT\b')
+_PLOT_PROPERTY = re.compile(r'^(\w+?)\s*=\s*(.*)$')
+_PLOT_GROUP_REFERENCE = re.compile(r'\\(?:g<(\w+)>|([1-9][0-9]?))')
+# the structure of analysis object paths, like in rivet.aopaths
+_AO_PATH = re.compile(r'^(/[^\[\]\@\#]+)(\[[A-Za-z\d\._=\s+-]+\])?(#\d+|@[\d\.]+)?$')
+_DROPPED_MACROS = frozenset(['ensuremath', 'displaystyle', 'textstyle', 'scriptstyle',
+                             'scriptscriptstyle', 'big', 'Big', 'bigg', 'Bigg',
+                             'bigl', 'bigr', 'Bigl', 'Bigr'])
 
 def errors_enabled(rivet_path):
     """Returns whether Rivet wants errors to be drawn."""
@@ -37,15 +83,21 @@ def legend_location_kwargs(rivet_path):
         return {'loc': 'best'}
 
 
-def apply_plot_info(rivet_path, main=None, diff=None):
-    """Applies Rivet plot information to a main axes and optionally to a diff axes."""
+def apply_plot_info(rivet_path, main=None, diff=None, configures_tex=None):
+    """Applies Rivet plot information to a main axes and optionally to a diff axes.
+
+    If main is None, the current pyplot axes are used. Unless configures_tex
+    is False, pyplot is configured to render the labels with LaTeX. For figures
+    that are not managed by pyplot, e.g. those created directly as
+    matplotlib.figure.Figure, this global setting is left untouched by
+    default, and only the labels are rendered with LaTeX (see set_labels)."""
     plot_info = load_plot_info(rivet_path)
-    print("Rivet plot info:")
-    pprint(plot_info)
+    _logger.debug("Rivet plot info of %s: %s", rivet_path, plot_info)
 
     # normalize main argument
-    if main is None:
-        main = plt.gca()
+    main = current_axes(main)
+    if configures_tex is None:
+        configures_tex = getattr(main.figure.canvas, 'manager', None) is not None
 
     # map lower and upper axes, which are the same if there is no diff axes
     upper = main
@@ -54,7 +106,7 @@ def apply_plot_info(rivet_path, main=None, diff=None):
     else:
         lower = diff
 
-    set_labels(plot_info, upper, lower)
+    set_labels(plot_info, upper, lower, configures_tex)
     set_axis_limits(plot_info, upper, lower)
     set_tick_locators(plot_info, upper, lower)
     set_axis_scales(plot_info, upper, lower)
@@ -66,21 +118,147 @@ def apply_plot_info(rivet_path, main=None, diff=None):
         except (KeyError, TypeError):
             pass
 
-def set_labels(plot_info, upper, lower):
-    """Sets labels from Rivet plot info."""
-    requires_tex = False
+def set_labels(plot_info, upper, lower, configures_tex=True):
+    """Sets labels from Rivet plot info and renders them with LaTeX. Unless
+    configures_tex is False, pyplot is configured to render all text with
+    LaTeX, otherwise only the labels are. With the preview profile, the
+    labels are translated into mathtext instead."""
+    preview = configuration.is_preview()
+    texts = []
     string_setters = {'Title': upper.set_title,
                       'XLabel': lower.set_xlabel, 'YLabel': upper.set_ylabel}
     for key, setter in string_setters.items():
         try:
             label = plot_info[key]
-            label = label.replace(r'\text', r'\mathrm')
-            setter(label)
-            requires_tex = True
+            if preview:
+                label = mathtext_label(label)
+            else:
+                label = label.replace(r'\text', r'\mathrm')
+            texts.append(setter(label))
         except (KeyError, TypeError):
             pass
-    if requires_tex:
+    if not texts or preview:
+        return
+    if configures_tex:
         configuration.use_tex(overwrite=False)
+    else:
+        # leave the text of other figures alone
+        for text in texts:
+            configuration.use_tex_for_text(text)
+
+@functools.lru_cache(maxsize=1024)
+def mathtext_label(label):
+    """Translates a LaTeX label from Rivet plot info into one that matplotlib
+    renders with mathtext.
+
+    Units (also those of siunitx) and particle names are replaced by their
+    symbols, and font macros and braces are removed outside of math. Other
+    macros are kept as symbols if mathtext knows them, and as their bare names
+    otherwise. Math that mathtext can still not parse is shown as plain
+    text."""
+    parts = _MATH_DELIMITER.split(label)
+    if len(parts) % 2 == 0:
+        # unbalanced dollar signs, treat everything as text
+        parts = [label.replace('$', '')]
+    translated_parts = []
+    for i, part in enumerate(parts):
+        if i % 2 == 0:
+            part = _SI_QUANTITY.sub(lambda match: '{} {}'.format(
+                match.group(1), _si_units(match.group(2))), part)
+            part = _SI_UNIT.sub(lambda match: _si_units(match.group(1)), part)
+            translated_parts.append(_TEXT_TOKEN.sub(_translate_text_token, part))
+            continue
+        part = _SI_QUANTITY.sub(lambda match: r'{}\,{}'.format(
+            match.group(1), _si_math_units(match.group(2))), part)
+        part = _SI_UNIT.sub(lambda match: _si_math_units(match.group(1)), part)
+        math = _MACRO.sub(_translate_math_macro, part)
+        if _is_valid_mathtext(math):
+            translated_parts.append('$' + math + '$')
+        else:
+            _logger.debug("Showing %r as plain text, mathtext can not parse it", part)
+            translated_parts.append(re.sub(r'[{}]', '', _MACRO.sub(_plain_text_macro, math)))
+    return ''.join(translated_parts)
+
+def _translate_text_token(match):
+    macro, escaped_character, brace, _ = match.groups()
+    if macro is not None:
+        if macro in _UNITS:
+            return macro
+        if macro in _PARTICLES:
+            return '$' + _PARTICLES[macro] + '$'
+        if macro in _MATH_FONTS or macro in _DROPPED_MACROS:
+            # keep only the arguments
+            return ''
+        if _is_valid_mathtext('\\' + macro):
+            return '$\\' + macro + '$'
+        return macro
+    if escaped_character is not None:
+        return escaped_character
+    if brace is not None:
+        return ''
+    return ' '
+
+def _translate_math_macro(match):
+    macro = match.group(1)
+    if macro in _UNITS:
+        return r'\mathrm{' + macro + '}'
+    if macro in _PARTICLES:
+        return '{' + _PARTICLES[macro] + '}'
+    if macro in _MATH_FONTS:
+        return '\\' + _MATH_FONTS[macro]
+    if macro in _DROPPED_MACROS:
+        return ''
+    return match.group(0)
+
+def _si_units(units):
+    """Translates the argument of the siunitx macros \\si and \\unit into
+    plain text, e.g. \\pico\\barn\\per\\GeV\\squared into pb/GeV\u00b2."""
+    symbols = []
+    power = ''
+    # whether a new unit must be separated from the previous one
+    separates = False
+    for match in _SI_TOKEN.finditer(units):
+        macro, character = match.groups()
+        if macro is None:
+            if character is not None:
+                symbols.append(character)
+                separates = character not in '/.'
+            continue
+        if macro == 'per':
+            symbols.append('/' if symbols else '1/')
+            separates = False
+        elif macro in _SI_POWERS:
+            symbols.append(_SI_POWERS[macro])
+        elif macro in _SI_POWER_PREFIXES:
+            power = _SI_POWER_PREFIXES[macro]
+        elif macro in _SI_PREFIXES:
+            if separates:
+                symbols.append(' ')
+            symbols.append(_SI_PREFIXES[macro])
+            separates = False
+        else:
+            if separates:
+                symbols.append(' ')
+            symbols.append(_SI_UNITS.get(macro, macro) + power)
+            power = ''
+            separates = True
+    return ''.join(symbols)
+
+def _si_math_units(units):
+    return r'\mathrm{' + _si_units(units).replace(' ', r'\,') + '}'
+
+def _plain_text_macro(match):
+    # keep the names of symbols, but not those of fonts
+    macro = match.group(1)
+    return '' if macro.startswith('math') else macro
+
+def _is_valid_mathtext(math):
+    from matplotlib.mathtext import MathTextParser
+    try:
+        MathTextParser('path').parse('$' + math + '$')
+    except ValueError:
+        return False
+    return True
 
 def set_axis_limits(plot_info, upper, lower):
     """Sets axis limits from Rivet plot info."""
@@ -94,6 +272,7 @@ def set_axis_limits(plot_info, upper, lower):
 
 def set_tick_locators(plot_info, upper, lower):
     """Sets major and minor tick locators from Rivet plot info."""
+    from matplotlib.ticker import MaxNLocator, NullLocator
     axis_lists = ((upper.get_xaxis, lower.get_xaxis), (upper.get_yaxis, ))
     # NOTE: It's not clear to me how MajorTickMarks is supposed to work
     # for axis_list, key in zip(axis_lists, prepend_x_y('MajorTickMarks')):
@@ -132,13 +311,140 @@ def set_axis_scales(plot_info, upper, lower):
     except (KeyError, TypeError):
         pass
 
+@instrumentation.instrumented('plot_info')
 def load_plot_info(rivet_path):
-    """Loads Rivet plot information."""
-    plot_parser = rivet.mkStdPlotParser()
+    """Loads Rivet plot information.
+
+    The plot information is cached for each rivet path, and reloaded only if
+    one of the .plot files of the analysis has been changed. Each .plot file
+    is parsed once (see plot_file_sections), and the sections whose pattern
+    matches the beginning of the rivet path are merged in the order of the
+    files, like Rivet does. Group references in the values are expanded with
+    the groups of the match."""
+    normalized_path = normalize_rivet_path(rivet_path)
+    signature = plot_files_signature(normalized_path)
+    try:
+        cached_signature, plot_info = _plot_info_cache[normalized_path]
+        if cached_signature == signature:
+            return plot_info
+    except KeyError:
+        pass
+    if 'MCgrid_' == rivet_path[1:8]:
+        _logger.info("Stripping prefix 'MCgrid_' from %s when loading plot info", rivet_path)
+    parser = plot_parser()
+    if not hasattr(parser, 'plotpaths'):
+        # the .plot files are not known, let Rivet find them
+        plot_info = parser.getHeaders(normalized_path)
+    else:
+        plot_info = {}
+        for plot_file, mtime_ns in signature:
+            for pattern, properties in plot_file_sections(plot_file, mtime_ns):
+                match = pattern.match(normalized_path)
+                if match is not None:
+                    for key, value in properties:
+                        plot_info[key] = expand_plot_value(match, value)
+    _plot_info_cache[normalized_path] = (signature, plot_info)
+    return plot_info
+
+def plot_file_sections(plot_file, mtime_ns=None):
+    """Returns the PLOT sections of a .plot file as a list of (compiled path
+    pattern, [(key, value), ...]) tuples. The file is only parsed again if its
+    modification time has changed."""
+    if mtime_ns is None:
+        mtime_ns = os.stat(plot_file).st_mtime_ns
+    try:
+        cached_mtime_ns, sections = _plot_file_cache[plot_file]
+        if cached_mtime_ns == mtime_ns:
+            return sections
+    except KeyError:
+        pass
+    sections = []
+    properties = None
+    with open(plot_file) as plot_file_object:
+        for line in plot_file_object:
+            if properties is None:
+                match = _PLOT_BEGIN.match(line)
+                if match is not None and match.group(1) == 'PLOT' and match.group(2):
+                    try:
+                        pattern = re.compile(match.group(2))
+                    except re.error:
+                        _logger.warning("Skipping the invalid path pattern %s in %s",
+                                        match.group(2), plot_file)
+                        continue
+                    properties = []
+                    sections.append((pattern, properties))
+            elif _PLOT_END.match(line) is not None:
+                properties = None
+            elif not line.lstrip().startswith('#'):
+                match = _PLOT_PROPERTY.match(line)
+                if match is not None:
+                    properties.append(match.group(1, 2))
+    _plot_file_cache[plot_file] = (mtime_ns, sections)
+    return sections
+
+def expand_plot_value(match, value):
+    """Returns a .plot file value with the group references \\1 or \\g<name>
+    replaced by the groups of the match of the section pattern. Unlike
+    match.expand, other backslashes are kept, as they are part of the LaTeX."""
+    if not match.re.groups:
+        return value
+    def group(reference):
+        name = reference.group(1) or reference.group(2)
+        try:
+            return match.group(int(name) if name.isdigit() else name) or ''
+        except IndexError:
+            return reference.group(0)
+    return _PLOT_GROUP_REFERENCE.sub(group, value)
+
+def normalize_rivet_path(rivet_path):
+    """Returns the rivet path that is used to look up the plot info, without a
+    leading /REF or /RAW component, the prefix 'MCgrid_' and the [variation]
+    or bin suffix, like the base path of rivet.aopaths.AOPath."""
+    match = _AO_PATH.match(rivet_path)
+    if match is not None:
+        rivet_path = match.group(1).rstrip('/')
+    parts = rivet_path.split('/')
+    if len(parts) > 2 and parts[1] in ('REF', 'RAW'):
+        rivet_path = '/' + '/'.join(parts[2:])
     if 'MCgrid_' == rivet_path[1:8]:
-        print("Stripping prefix 'MCgrid_' from rivet path when loading plot info")
         rivet_path = '/' + rivet_path[8:]
-    return plot_parser.getHeaders(rivet_path)
+    return rivet_path
+
+def plot_parser():
+    """Returns the Rivet plot parser that is shared within the process."""
+    global _plot_parser
+    if _plot_parser is None:
+        import rivet
+        _plot_parser = rivet.mkStdPlotParser()
+    return _plot_parser
+
+def plot_files(rivet_path):
+    """Returns the names of the .plot files that might hold plot information
+    for a rivet path, whether they exist or not."""
+    parser = plot_parser()
+    analysis = normalize_rivet_path(rivet_path).strip('/').split('/')[0]
+    names = [os.path.join(plot_path, analysis + '.plot')
+             for plot_path in getattr(parser, 'plotpaths', [])]
+    names.extend(getattr(parser, 'addfiles', []))
+    return names
+
+def plot_files_signature(rivet_path):
+    """Returns the modification times of the .plot files that are relevant for
+    a rivet path."""
+    signature = []
+    for plot_file in plot_files(rivet_path):
+        try:
+            signature.append((plot_file, os.stat(plot_file).st_mtime_ns))
+        except OSError:
+            pass
+    return tuple(signature)
+
+def clear_plot_info_cache():
+    """Forgets all cached plot information and the shared plot parser."""
+    global _plot_parser
+    _plot_parser = None
+    _plot_info_cache.clear()
+    _plot_file_cache.clear()
 
 def prepend_x_y(key):
     """Returns X... and Y... variants for a given string following a convention from Rivet."""
@@ -0,0 +1,176 @@
+"""An opt-in on-disk cache that stores the Histo1D and Scatter2D objects of
+YODA files as NumPy arrays, such that unchanged files do not have to be parsed
+again in later sessions.
+
+The entries are keyed by the SHA-1 hash of the content of the YODA file. Each
+entry consists of a .npy file holding all bins of all data objects, which is
+loaded with memory mapping, and a .json file describing the data objects.
+Entries are written to temporary files first and then atomically moved into
+place, such that several processes can safely fill the same cache directory.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from .histogram import Histogram
+
+FORMAT_VERSION = 1
+
+# the per-bin columns, each stored as one contiguous row of a data object
+_COLUMNS = ('x', 'xerr-', 'xerr+', 'y', 'yerr-', 'yerr+', 'sumw', 'sumw2')
+
+_cache_dir = None
+_max_bytes = 2 * 1024**3
+
+
+def enable(cache_dir=None, max_bytes=None):
+    """Enable the cache. The default directory is $HEPPYPLOTLIB_CACHE_DIR,
+    or heppyplotlib within the user's cache directory. If the entries in the
+    directory exceed max_bytes, the least recently used ones are removed."""
+    global _cache_dir, _max_bytes
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    # several processes might create the directory at the same time
+    os.makedirs(cache_dir, exist_ok=True)
+    _cache_dir = cache_dir
+    if max_bytes is not None:
+        _max_bytes = max_bytes
+
+
+def disable():
+    """Disable the cache. Existing entries are kept on disk."""
+    global _cache_dir
+    _cache_dir = None
+
+
+def is_enabled():
+    """Return whether the cache is enabled."""
+    return _cache_dir is not None
+
+
+def default_cache_dir():
+    """Return the default cache directory."""
+    try:
+        return os.environ['HEPPYPLOTLIB_CACHE_DIR']
+    except KeyError:
+        cache_home = os.environ.get('XDG_CACHE_HOME',
+                                    os.path.join(os.path.expanduser('~'), '.cache'))
+        return os.path.join(cache_home, 'heppyplotlib')
+
+
+def content_hash(filename):
+    """Return the SHA-1 hex digest of the content of a file."""
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as content:
+        for chunk in iter(lambda: content.read(1024**2), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def load(digest):
+    """Return a dict of memory-mapped histograms for a content hash, or None
+    if there is no complete entry."""
+    base = os.path.join(_cache_dir, digest)
+    try:
+        with open(base + '.json') as description_file:
+            description = json.load(description_file)
+        if description['version'] != FORMAT_VERSION:
+            return None
+        columns = np.load(base + '.npy', mmap_mode='r')
+    except (IOError, OSError, ValueError, KeyError):
+        return None
+    # mark the entry as recently used for the size limit
+    try:
+        os.utime(base + '.json')
+    except OSError:
+        pass
+    histograms = {}
+    for entry in description['objects']:
+        begin, nbins = entry['offset'], entry['bins']
+        rows = columns[begin:begin + len(_COLUMNS) * nbins].reshape(len(_COLUMNS), nbins)
+        if entry['type'] == 'Histo1D':
+            sumw, sumw2 = rows[6], rows[7]
+        else:
+            sumw, sumw2 = None, None
+        histograms[entry['name']] = Histogram(rows[0], rows[1:3], rows[3], rows[4:6],
+                                              sumw=sumw, sumw2=sumw2,
+                                              path=entry['path'], title=entry['title'],
+                                              type_name=entry['type'])
+    return histograms
+
+
+def store(digest, histograms):
+    """Write a dict of histograms into the cache under a content hash."""
+    objects = []
+    blocks = []
+    offset = 0
+    for name, histogram in histograms.items():
+        nbins = len(histogram)
+        block = np.empty((len(_COLUMNS), nbins), dtype=np.float64)
+        block[0] = histogram.x
+        block[1:3] = histogram.x_errs
+        block[3] = histogram.y
+        block[4:6] = histogram.y_errs
+        if histogram.sumw is None:
+            block[6:8] = np.nan
+        else:
+            block[6] = histogram.sumw
+            block[7] = histogram.sumw2
+        blocks.append(block.ravel())
+        objects.append({'name': name, 'path': histogram.path, 'title': histogram.title,
+                        'type': histogram.type, 'offset': offset, 'bins': nbins})
+        offset += block.size
+    columns = np.concatenate(blocks) if blocks else np.empty(0, dtype=np.float64)
+    base = os.path.join(_cache_dir, digest)
+    # the description is moved into place last, it marks the entry as complete
+    _write_atomically(base + '.npy', lambda handle: np.save(handle, columns))
+    _write_atomically(base + '.json',
+                      lambda handle: handle.write(json.dumps(
+                          {'version': FORMAT_VERSION, 'objects': objects}).encode('utf-8')))
+    enforce_size_limit()
+
+
+def enforce_size_limit():
+    """Remove the least recently used entries until the cache fits into its
+    size limit."""
+    entries = []
+    total_size = 0
+    for file_name in os.listdir(_cache_dir):
+        if not file_name.endswith('.json'):
+            continue
+        base = os.path.join(_cache_dir, file_name[:-len('.json')])
+        try:
+            last_used = os.stat(base + '.json').st_mtime
+            size = os.stat(base + '.json').st_size + os.stat(base + '.npy').st_size
+        except OSError:
+            continue
+        entries.append((last_used, size, base))
+        total_size += size
+    for _, size, base in sorted(entries):
+        if total_size <= _max_bytes:
+            break
+        for suffix in ('.json', '.npy'):
+            try:
+                os.remove(base + suffix)
+            except OSError:
+                pass
+        total_size -= size
+
+
+def _write_atomically(filename, write):
+    handle, temporary_filename = tempfile.mkstemp(dir=os.path.dirname(filename),
+                                                  suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as temporary_file:
+            write(temporary_file)
+        os.replace(temporary_filename, filename)
+    except Exception:
+        try:
+            os.remove(temporary_filename)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,135 @@
+"""Track whether rendered plots are up to date with their inputs, such that
+only the plots of changed data objects are rendered again (see the --watch
+and --manifest options of hpl-render).
+
+The inputs of a plot are summarized by a digest of the blocks of its data
+object within each YODA file, the content of the relevant Rivet .plot files
+and the render settings. Digests are only recalculated for files whose
+modification time or size has changed. A manifest stores the digest of each
+rendered plot together with its output files, such that a later process can
+skip the plots that are still up to date."""
+
+import hashlib
+import json
+import mmap
+import os
+
+from . import sidecar, yodaindex
+
+MANIFEST_VERSION = 1
+
+# the digests of each file, with the modification time and size they belong to
+_block_digests = {}
+_file_digests = {}
+
+
+def block_digests(filename):
+    """Return a dict that maps the data object paths of a YODA file to the
+    SHA-1 digests of their blocks."""
+    stat = os.stat(filename)
+    key = (stat.st_mtime_ns, stat.st_size)
+    path = os.path.abspath(filename)
+    try:
+        cached_key, digests = _block_digests[path]
+        if cached_key == key:
+            return digests
+    except KeyError:
+        pass
+    digests = {}
+    if yodaindex.is_compressed(filename):
+        for name, _, _, block in yodaindex.iter_blocks(filename):
+            digests[name] = hashlib.sha1(block).hexdigest()
+        _block_digests[path] = (key, digests)
+        return digests
+    index = yodaindex.build_index(filename)
+    if index:
+        with open(filename, 'rb') as yoda_file:
+            with mmap.mmap(yoda_file.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                for name, (_, begin, end) in index.items():
+                    digests[name] = hashlib.sha1(content[begin:end]).hexdigest()
+    _block_digests[path] = (key, digests)
+    return digests
+
+
+def file_digest(filename):
+    """Return the SHA-1 digest of the content of a file, or None if it does not
+    exist."""
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    key = (stat.st_mtime_ns, stat.st_size)
+    path = os.path.abspath(filename)
+    try:
+        cached_key, digest = _file_digests[path]
+        if cached_key == key:
+            return digest
+    except KeyError:
+        pass
+    digest = sidecar.content_hash(filename)
+    _file_digests[path] = (key, digest)
+    return digest
+
+
+def observable_digest(files, rivet_path, settings, plot_files=()):
+    """Return a digest of the inputs of a plot: the blocks of the data object
+    within each file, the content of the .plot files, and the settings, which
+    must be serializable as JSON."""
+    inputs = {'settings': settings,
+              'blocks': [block_digests(filename).get(rivet_path) for filename in files],
+              'plot_files': [[plot_file, file_digest(plot_file)] for plot_file in plot_files]}
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def files_state(files):
+    """Return the modification times and sizes of files, to tell whether they
+    are still being written."""
+    state = []
+    for filename in files:
+        try:
+            stat = os.stat(filename)
+            state.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            state.append(None)
+    return state
+
+
+class Manifest(object):
+    """The digests and output files of rendered plots, stored as JSON."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.plots = {}
+        try:
+            with open(filename) as manifest_file:
+                content = json.load(manifest_file)
+            if content['version'] == MANIFEST_VERSION:
+                self.plots = content['plots']
+        except (IOError, ValueError, KeyError, TypeError):
+            pass
+
+    def is_up_to_date(self, output_base_name, digest):
+        """Return whether a plot has been rendered from inputs with the given
+        digest, and its output files still exist."""
+        entry = self.plots.get(output_base_name)
+        return (entry is not None and entry['digest'] == digest
+                and all(os.path.exists(filename) for filename in entry['files']))
+
+    def record(self, output_base_name, digest, written_files):
+        """Record that a plot has been rendered."""
+        self.plots[output_base_name] = {'digest': digest, 'files': list(written_files)}
+
+    def forget(self, output_base_name):
+        """Mark a plot as out of date, e.g. because rendering it failed."""
+        self.plots.pop(output_base_name, None)
+
+    def save(self):
+        """Write the manifest, replacing the previous one atomically."""
+        directory = os.path.dirname(self.filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        temporary_filename = '{}.{}.tmp'.format(self.filename, os.getpid())
+        with open(temporary_filename, 'w') as manifest_file:
+            json.dump({'version': MANIFEST_VERSION, 'plots': self.plots}, manifest_file,
+                      indent=1, sort_keys=True)
+        os.replace(temporary_filename, self.filename)
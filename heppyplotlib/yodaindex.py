@@ -0,0 +1,185 @@
+"""Index the data object blocks of YODA files by their byte offsets, such that
+single data objects can be read without parsing the whole file.
+
+Compressed files (.gz and .xz) can not be read at an offset. Their blocks are
+read with iter_blocks, which decompresses them while reading and stops as
+soon as the iteration is stopped, and their offsets refer to the decompressed
+content."""
+
+from collections import OrderedDict
+import json
+import mmap
+import os
+import re
+
+INDEX_SUFFIX = '.hplidx'
+
+_MARKER = re.compile(rb'^(?:#[ \t]*)?(BEGIN|END)[ \t]+YODA_(\w+)(?:[ \t]+(\S+))?',
+                     re.MULTILINE)
+_VERSION_SUFFIX = re.compile(r'_V\d+$')
+_TYPE_NAMES = {'COUNTER': 'Counter',
+               'HISTO1D': 'Histo1D', 'HISTO2D': 'Histo2D',
+               'PROFILE1D': 'Profile1D', 'PROFILE2D': 'Profile2D',
+               'SCATTER1D': 'Scatter1D', 'SCATTER2D': 'Scatter2D',
+               'SCATTER3D': 'Scatter3D'}
+
+
+def build_index(filename):
+    """Scan a YODA file once and return an OrderedDict that maps each data
+    object path to a (type, begin, end) tuple, where begin and end are the
+    byte offsets of its BEGIN/END block."""
+    index = OrderedDict()
+    if is_compressed(filename):
+        for name, type_, begin, block in iter_blocks(filename):
+            index[name] = (type_, begin, begin + len(block))
+        return index
+    with open(filename, 'rb') as yoda_file:
+        if os.fstat(yoda_file.fileno()).st_size == 0:
+            return index
+        with mmap.mmap(yoda_file.fileno(), 0, access=mmap.ACCESS_READ) as content:
+            begin = None
+            for match in _MARKER.finditer(content):
+                if match.group(1) == b'BEGIN':
+                    begin = match
+                elif begin is not None:
+                    end = content.find(b'\n', match.end())
+                    end = len(content) if end == -1 else end + 1
+                    name = begin.group(3).decode('utf-8')
+                    index[name] = (type_name(begin.group(2).decode('utf-8')),
+                                   begin.start(), end)
+                    begin = None
+    return index
+
+
+def load_index(filename, persist=False):
+    """Return the index of a YODA file, reusing the index persisted next to the
+    file if it is still up to date. If persist is True, a newly built index is
+    written next to the file."""
+    stat = os.stat(filename)
+    index_filename = filename + INDEX_SUFFIX
+    try:
+        with open(index_filename) as index_file:
+            persisted = json.load(index_file)
+        if (persisted['mtime_ns'] == stat.st_mtime_ns
+                and persisted['size'] == stat.st_size):
+            return OrderedDict((name, (type_, begin, end))
+                               for name, type_, begin, end in persisted['objects'])
+    except (IOError, ValueError, KeyError, TypeError):
+        pass
+    index = build_index(filename)
+    if persist:
+        save_index(filename, index, stat)
+    return index
+
+
+def save_index(filename, index, stat=None):
+    """Write the index of a YODA file next to it."""
+    if stat is None:
+        stat = os.stat(filename)
+    index_filename = filename + INDEX_SUFFIX
+    temporary_filename = '{}.{}.tmp'.format(index_filename, os.getpid())
+    persisted = {'mtime_ns': stat.st_mtime_ns,
+                 'size': stat.st_size,
+                 'objects': [[name] + list(entry) for name, entry in index.items()]}
+    try:
+        with open(temporary_filename, 'w') as index_file:
+            json.dump(persisted, index_file)
+        os.replace(temporary_filename, index_filename)
+    except (IOError, OSError):
+        # the directory might be read-only, the index is just not persisted then
+        try:
+            os.remove(temporary_filename)
+        except OSError:
+            pass
+
+
+def read_blocks(filename, index, names):
+    """Return the text of the BEGIN/END blocks of the named data objects."""
+    if is_compressed(filename):
+        return stream_blocks(filename, names)
+    blocks = []
+    with open(filename, 'rb') as yoda_file:
+        for name in names:
+            _, begin, end = index[name]
+            yoda_file.seek(begin)
+            blocks.append(yoda_file.read(end - begin))
+    return b''.join(blocks).decode('utf-8')
+
+
+def stream_blocks(filename, names):
+    """Return the text of the BEGIN/END blocks of the named data objects,
+    reading the file only up to the last of them. Raise a KeyError if one of
+    them is not found."""
+    blocks = {}
+    missing_names = set(names)
+    if missing_names:
+        for name, _, _, block in iter_blocks(filename):
+            if name in missing_names:
+                blocks[name] = block
+                missing_names.discard(name)
+                if not missing_names:
+                    break
+    for name in names:
+        if name not in blocks:
+            raise KeyError("{} not found in {}".format(name, filename))
+    return b''.join(blocks[name] for name in names).decode('utf-8')
+
+
+def iter_blocks(filename, chunk_size=1024**2):
+    """Yield a (name, type, begin, block) tuple for each data object of a YODA
+    file, where block holds the bytes of its BEGIN/END block and begin their
+    offset. Compressed files are decompressed while reading."""
+    with open_yoda(filename) as yoda_file:
+        buffer = bytearray()
+        # the offset of the buffer within the file, where to continue scanning
+        # it, and the start, name and type of a block whose END is not read yet
+        buffer_offset = 0
+        scan_begin = 0
+        pending = None
+        at_end = False
+        while not at_end:
+            chunk = yoda_file.read(chunk_size)
+            at_end = not chunk
+            buffer.extend(chunk)
+            # only scan complete lines
+            scan_end = len(buffer) if at_end else buffer.rfind(b'\n') + 1
+            for match in _MARKER.finditer(buffer, scan_begin, scan_end):
+                if match.group(1) == b'BEGIN':
+                    pending = (match.start(), match.group(3).decode('utf-8'),
+                               type_name(match.group(2).decode('utf-8')))
+                elif pending is not None:
+                    end = buffer.find(b'\n', match.end(), scan_end)
+                    end = scan_end if end == -1 else end + 1
+                    yield (pending[1], pending[2], buffer_offset + pending[0],
+                           bytes(buffer[pending[0]:end]))
+                    pending = None
+            # keep the lines that are not scanned yet and an incomplete block
+            consumed = scan_end if pending is None else pending[0]
+            del buffer[:consumed]
+            buffer_offset += consumed
+            scan_begin = scan_end - consumed
+            if pending is not None:
+                pending = (0,) + pending[1:]
+
+
+def open_yoda(filename):
+    """Open a YODA file for reading bytes, decompressing .gz and .xz files."""
+    if filename.endswith('.gz'):
+        import gzip
+        return gzip.open(filename, 'rb')
+    if filename.endswith('.xz'):
+        import lzma
+        return lzma.open(filename, 'rb')
+    return open(filename, 'rb')
+
+
+def is_compressed(filename):
+    """Return whether a YODA file is compressed."""
+    return filename.endswith(('.gz', '.xz'))
+
+
+def type_name(block_type):
+    """Translate a block type like HISTO1D_V2 into a YODA type name like
+    Histo1D."""
+    block_type = _VERSION_SUFFIX.sub('', block_type.upper())
+    return _TYPE_NAMES.get(block_type, block_type)
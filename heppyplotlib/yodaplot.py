@@ -1,146 +1,159 @@
 """Functions for plotting data objects within YODA files."""
 
-import matplotlib.pyplot as plt
+import logging
+
 import numpy as np
-import yoda
+
+from . import arithmetic, configuration, instrumentation, loader, rebinning
+from .histogram import Histogram, has_yoda
+from .plot import current_axes
+
+_logger = logging.getLogger(__name__)
 
 def plot(filename_or_data_object, data_object_name,
-         errors_enabled=True, rebin_count=1, visible=True,
+         errors_enabled=True, rebin_count=1, visible=True, axes=None,
          **kwargs):
-    """Plots a data object, potentially from a YODA file."""
+    """Plots a data object, potentially from a YODA file, into the given axes
+    or into the current pyplot axes."""
     data_object = resolve_data_object(filename_or_data_object, data_object_name,
-                                      rebin_count=rebin_count)
-    return plot_data_object(data_object, errors_enabled, visible, **kwargs)
+                                      rebin_count=rebin_count, as_histogram=True)
+    return plot_data_object(data_object, errors_enabled, visible, axes=axes, **kwargs)
 
 def plot_data_object(data_object,
-                     errors_enabled=True, visible=True,
+                     errors_enabled=True, visible=True, axes=None,
                      **kwargs):
     """Plots a YODA data object."""
-    plotfunctions = {yoda.Scatter2D: plot_scatter2d, yoda.Histo1D: plot_histo1d}
-    for classinfo, plotfunction in plotfunctions.items():
-        if isinstance(data_object, classinfo):
-            return plotfunction(data_object, errors_enabled, visible, **kwargs)
-    raise Exception('Unknown type of YODA data object: ', data_object)
+    histogram = Histogram.from_yoda(data_object)
+    if histogram.type == 'Histo1D':
+        return plot_histo1d(histogram, errors_enabled, visible, axes=axes, **kwargs)
+    return plot_scatter2d(histogram, errors_enabled, visible, axes=axes, **kwargs)
 
 def get_y_coords(yoda_data_object):
     """Return y coordinates for a YODA data object of an unknown type."""
-    getter_functions = {yoda.Scatter2D: get_scatter2d_y_coords, yoda.Histo1D: get_histo1d_y_coords}
-    for classinfo, getter_function in getter_functions.items():
-        if isinstance(yoda_data_object, classinfo):
-            return getter_function(yoda_data_object)
+    return Histogram.from_yoda(yoda_data_object).y
 
-def plot_scatter2d(scatter, errors_enabled=True, visible=True, **kwargs):
+@instrumentation.instrumented('artists')
+def plot_scatter2d(scatter, errors_enabled=True, visible=True, axes=None, **kwargs):
     """Plots a YODA Scatter2D object."""
-    x_coords = [point.x() for point in scatter.points()]
-    y_coords = get_scatter2d_y_coords(scatter)
+    axes = current_axes(axes)
+    histogram = Histogram.from_yoda(scatter)
+    x_coords = histogram.x
+    y_coords = histogram.y
     if visible:
-        x_errs = []
-        x_errs.append([point.xErrs()[0] for point in scatter.points()])
-        x_errs.append([point.xErrs()[1] for point in scatter.points()])
+        x_errs = histogram.x_errs
         bins_are_adjacent = are_points_with_errors_adjacent(x_coords, x_errs)
         if errors_enabled:
-            y_errs = []
-            y_errs.append([point.yErrs()[0] for point in scatter.points()])
-            y_errs.append([point.yErrs()[1] for point in scatter.points()])
+            y_errs = histogram.y_errs
         else:
             y_errs = None
         if "xmin" in kwargs:
-            for i, x in enumerate(x_coords):
-                if x >= kwargs["xmin"]:
-                    break
+            i = first_index_from(x_coords, kwargs.pop("xmin"))
             x_coords = x_coords[i:]
             y_coords = y_coords[i:]
-            x_errs[0] = x_errs[0][i:]
-            x_errs[1] = x_errs[1][i:]
+            x_errs = x_errs[:, i:]
             if y_errs is not None:
-                y_errs[0] = y_errs[0][i:]
-                y_errs[1] = y_errs[1][i:]
-            del kwargs["xmin"]
+                y_errs = y_errs[:, i:]
     else:
         bins_are_adjacent = False
         x_errs = None
         y_errs = None
     if not bins_are_adjacent:
-        return plt.errorbar(x_coords, y_coords,
-                            fmt='o', xerr=x_errs, yerr=y_errs, visible=visible, **kwargs)
+        return axes.errorbar(x_coords, y_coords,
+                             fmt='o', xerr=x_errs, yerr=y_errs, visible=visible, **kwargs)
     else:
         return step_with_errorbar_using_points(x_coords, x_errs, y_coords, y_errs,
-                                               errors_enabled=errors_enabled, visible=visible, **kwargs)
+                                               errors_enabled=errors_enabled, visible=visible,
+                                               axes=axes, **kwargs)
 
 def get_scatter2d_y_coords(scatter):
     """Return y coordinates for a Scatter2D object."""
-    return [point.y() for point in scatter.points()]
+    return Histogram.from_yoda(scatter).y
 
-def plot_histo1d(histo, errors_enabled=True, visible=True, **kwargs):
+def plot_histo1d(histo, errors_enabled=True, visible=True, axes=None, **kwargs):
     """Plots a YODA Histo1D object."""
-    return plot_histo1d_bins(histo.bins(), errors_enabled, visible, **kwargs)
+    histogram = Histogram.from_yoda(histo)
+    return plot_bins(histogram.x_lows, histogram.widths, histogram.y, histogram.y_errs[0],
+                     errors_enabled, visible, axes=axes, **kwargs)
 
-def plot_histo1d_bins(bins, errors_enabled=True, visible=True, **kwargs):
+def plot_histo1d_bins(bins, errors_enabled=True, visible=True, axes=None, **kwargs):
     """Plots YODA Histo 1D bins."""
-    x_lefts = [histo_bin.xEdges()[0] for histo_bin in bins]
-    widths = [histo_bin.xEdges()[1] - histo_bin.xEdges()[0] for histo_bin in bins]
+    columns = np.array([(histo_bin.xEdges()[0], histo_bin.xEdges()[1] - histo_bin.xEdges()[0],
+                         histo_bin.height(), histo_bin.heightErr())
+                        for histo_bin in bins], dtype=np.float64).reshape(-1, 4).T
+    return plot_bins(*columns, errors_enabled=errors_enabled, visible=visible, axes=axes,
+                     **kwargs)
+
+@instrumentation.instrumented('artists')
+def plot_bins(x_lefts, widths, y_coords, y_errs,
+              errors_enabled=True, visible=True, axes=None, **kwargs):
+    """Plots bins given as arrays of left edges, widths, heights and height errors."""
+    axes = current_axes(axes)
     bins_are_adjacent = are_bins_adjacent(x_lefts, widths)
-    y_coord = get_histo1d_y_coords(bins)
-    y_errs = [histo_bin.heightErr() for histo_bin in bins]
     if "xmin" in kwargs:
-        for i, x_left in enumerate(x_lefts):
-            if x_left >= kwargs["xmin"]:
-                break
+        i = first_index_from(x_lefts, kwargs.pop("xmin"))
         x_lefts = x_lefts[i:]
         widths = widths[i:]
-        y_coord = y_coord[i:]
+        y_coords = y_coords[i:]
         y_errs = y_errs[i:]
-        del kwargs["xmin"]
     if not bins_are_adjacent:
-        result = plt.bar(x_lefts, y_coord, width=widths, yerr=y_errs, visible=visible, **kwargs)
+        result = axes.bar(x_lefts, y_coords, width=widths, yerr=y_errs, visible=visible, **kwargs)
     else:
-        result = plot_step_with_errorbar(x_lefts, widths, y_coord, y_errs,
-                                         errors_enabled=errors_enabled, visible=visible, **kwargs)
+        result = plot_step_with_errorbar(x_lefts, widths, y_coords, y_errs,
+                                         errors_enabled=errors_enabled, visible=visible,
+                                         axes=axes, **kwargs)
     return result
 
 def get_histo1d_y_coords(histo_or_bins):
     """Return y coordinates for a Histo1D object."""
-    if isinstance(histo_or_bins, yoda.Histo1D):
-        bins = histo_or_bins.bins()
-    else:
-        bins = histo_or_bins
-    return [histo_bin.height() for histo_bin in bins]
+    if isinstance(histo_or_bins, Histogram) or hasattr(histo_or_bins, 'bins'):
+        return Histogram.from_yoda(histo_or_bins).y
+    return np.array([histo_bin.height() for histo_bin in histo_or_bins], dtype=np.float64)
+
+def first_index_from(coords, minimum):
+    """Returns the index of the first of the (sorted) coords that is not below
+    minimum, or the last index if there is no such coord."""
+    return min(int(np.searchsorted(coords, minimum, side='left')), len(coords) - 1)
 
 def are_points_with_errors_adjacent(points, errs):
     """Returns whether a given set of points are adjacent when taking their errors into account."""
-    for i in range(len(points) - 1):
-        point = points[i]
-        err_right = errs[0][i]
-        next_point = points[i + 1]
-        next_err_left = errs[1][i + 1]
-        right_edge = point + err_right
-        left_edge = next_point - next_err_left
-        if abs(left_edge - right_edge) > (err_right + next_err_left) / 100.0:
-            return False
-    return True
+    points = np.asarray(points, dtype=np.float64)
+    errs = np.asarray(errs, dtype=np.float64)
+    errs_left = errs[0][1:]
+    errs_right = errs[1][:-1]
+    right_edges = points[:-1] + errs_right
+    left_edges = points[1:] - errs_left
+    return not np.any(np.abs(left_edges - right_edges) > (errs_right + errs_left) / 100.0)
 
 def are_bins_adjacent(lefts, widths):
     """Returns whether a given set of bins are adjacent."""
-    for left, width, next_left in zip(lefts[:-1], widths[:-1], lefts[1:]):
-        if next_left == 0:
-            if abs(left + width) > 1e-4:
-                return False
-        elif abs((left + width - next_left)/next_left) > 1e-4:
-            return False
-    return True
+    lefts = np.asarray(lefts, dtype=np.float64)
+    widths = np.asarray(widths, dtype=np.float64)
+    right_edges = lefts[:-1] + widths[:-1]
+    next_lefts = lefts[1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        deviations = np.where(next_lefts == 0,
+                              np.abs(right_edges),
+                              np.abs((right_edges - next_lefts) / next_lefts))
+    return not np.any(deviations > 1e-4)
 
 def step_with_errorbar_using_points(x_coords, x_errs, y_coords, y_errs,
                                     errors_enabled=True, **kwargs):
     """Makes a step plot with error bars from points."""
-    left = [coord - err_left for coord, err_left in zip(x_coords, x_errs[0])]
-    widths = [err_left + err_right for err_left, err_right in zip(x_errs[0], x_errs[1])]
-    return plot_step_with_errorbar(left, widths, y_coords, y_errs, errors_enabled, **kwargs)
+    x_errs = np.asarray(x_errs, dtype=np.float64)
+    lefts = np.asarray(x_coords, dtype=np.float64) - x_errs[0]
+    widths = x_errs[0] + x_errs[1]
+    return plot_step_with_errorbar(lefts, widths, y_coords, y_errs, errors_enabled, **kwargs)
 
 def plot_step_with_errorbar(lefts, widths, y_coords, y_errs,
-                            errors_enabled=True, use_errorrects_for_legend=False, **kwargs):
-    """Makes a step plot with error bars."""
-    lefts.append(lefts[-1] + widths[-1])
-    y_coords.append(y_coords[-1])
+                            errors_enabled=True, use_errorrects_for_legend=False, axes=None,
+                            **kwargs):
+    """Makes a step plot with error bars.
+
+    The steps are drawn as a single line and the errors as a single polygon
+    (see plot_errorrects), both are returned."""
+    axes = current_axes(axes)
+    edges = np.append(lefts, lefts[-1] + widths[-1])
+    y_coords = np.asarray(y_coords, dtype=np.float64)
     # prevent that we have labels for the step and the errorbar,
     # otherwise we have two legend entries per data set
     step_kwargs = dict(kwargs)
@@ -150,18 +163,19 @@ def plot_step_with_errorbar(lefts, widths, y_coords, y_errs,
             del step_kwargs["label"]
         else:
             del rect_kwargs["label"]
-    # delete kw args that are not defined for plt.step
+    # delete kw args that are not defined for Axes.step
     try:
         del step_kwargs["hatch"]
     except KeyError:
         pass
-    step_result = plt.step(lefts, y_coords, where='post', **step_kwargs)
+    step_result = axes.step(edges, np.append(y_coords, y_coords[-1]), where='post',
+                            **step_kwargs)
     if errors_enabled:
         try:
             ecolor = rect_kwargs["color"]
             del rect_kwargs["color"]
         except KeyError:
-            ecolor = plt.gca().lines[-1].get_color()  # do not use the next color from the color cycle
+            ecolor = step_result[-1].get_color()  # do not use the next color from the color cycle
         try:
             del rect_kwargs["marker"]
         except KeyError:
@@ -170,59 +184,95 @@ def plot_step_with_errorbar(lefts, widths, y_coords, y_errs,
             del rect_kwargs["zorder"]
         except KeyError:
             pass
-        zorder = plt.gca().lines[-1].get_zorder() - 1  # make sure it's drawn below
-        errorrects_result = plot_errorrects(lefts, y_coords, y_errs, ecolor, zorder, **rect_kwargs)
+        zorder = step_result[-1].get_zorder() - 1  # make sure it's drawn below
+        errorrects_result = plot_errorrects(edges, y_coords, y_errs, ecolor, zorder,
+                                            axes=axes, **rect_kwargs)
         # x_mids = [left + width / 2.0 for left, width in zip(lefts[:-1], widths)]
         # plt.errorbar(x_mids, y_coords[:-1], fmt='none', yerr=y_errs, ecolor=ecolor)
     else:
         errorrects_result = None
     return step_result, errorrects_result
 
-def plot_errorrects(lefts, y_coords, y_errs, color, zorder=1, **kwargs):
-    """Draws the y errors as an envelope for a step plot."""
-    try:
-        if not len(y_errs) == len(lefts) - 1:
-            y_errs = zip(*y_errs)  # try transposing
-            if not len(y_errs) == len(lefts) - 1:
-                raise Exception("There are less y errors than points.")
-    except TypeError:
-        pass
-    lefts = np.ravel(list(zip(lefts[:-1], lefts[1:])))
-    try:
-        coords_and_errs = list(zip(y_coords, y_errs))
-        y_down = np.ravel([[y - y_err[1]] * 2 for y, y_err in coords_and_errs])
-        y_up   = np.ravel([[y + y_err[0]] * 2 for y, y_err in coords_and_errs])
-    except TypeError:
-        y_down = np.ravel([[y - y_err] * 2 for y, y_err in zip(y_coords, y_errs)])
-        y_up = np.ravel([[y + y_err] * 2 for y, y_err in zip(y_coords, y_errs)])
+def plot_errorrects(edges, y_coords, y_errs, color, zorder=1, axes=None, **kwargs):
+    """Draws the y errors as an envelope for a step plot, given the bin edges.
+
+    y_errs are either symmetric errors, or lower and upper errors with the
+    shape (2, number of bins). The envelope is drawn as a single polygon, or
+    as two lines if a linewidth is given. With the preview profile, it is
+    rasterized unless rasterized is given."""
+    from matplotlib.collections import PolyCollection
+    axes = current_axes(axes)
+    if configuration.is_preview():
+        kwargs.setdefault('rasterized', True)
+    x_steps, y_down, y_up = errorrects_steps(edges, y_coords, y_errs)
     if 'hatch' in kwargs:
-        return plt.fill_between(lefts, y_up, y_down,
-                                color='none',
-                                edgecolor=color,
-                                alpha=1.0,
-                                zorder=zorder, **kwargs)
+        return axes.add_collection(PolyCollection([envelope_vertices(x_steps, y_down, y_up)],
+                                                  facecolor='none',
+                                                  edgecolor=color,
+                                                  alpha=1.0,
+                                                  zorder=zorder, **kwargs))
     else:
         if 'linewidth' in kwargs:
-            up = plt.plot(lefts, y_up,
-                          color=color,
-                          zorder=zorder, **kwargs)
-            down = plt.plot(lefts, y_down,
-                            color=color,
-                            zorder=zorder, **kwargs)
+            up = axes.plot(x_steps, y_up,
+                           color=color,
+                           zorder=zorder, **kwargs)
+            kwargs.pop('label', None)  # one legend entry is enough
+            down = axes.plot(x_steps, y_down,
+                             color=color,
+                             zorder=zorder, **kwargs)
             return (up, down)
         else:
             if not 'alpha' in kwargs:
                 kwargs['alpha'] = 0.3
-            return plt.fill_between(list(lefts), list(y_up), list(y_down),
-                                    color=[color],
-                                    linewidth=0.0,
-                                    zorder=int(zorder), **kwargs)
+            return axes.add_collection(PolyCollection([envelope_vertices(x_steps, y_down, y_up)],
+                                                      color=[color],
+                                                      linewidth=0.0,
+                                                      zorder=int(zorder), **kwargs))
+
+def errorrects_steps(edges, y_coords, y_errs):
+    """Returns the x and the lower and upper y coordinates of the steps of an
+    error envelope, given the bin edges, the values and their errors."""
+    edges = np.asarray(edges, dtype=np.float64)
+    nbins = len(edges) - 1
+    y_coords = np.asarray(y_coords, dtype=np.float64)[:nbins]
+    y_errs = np.asarray(y_errs, dtype=np.float64)
+    if y_errs.ndim == 1:
+        y_errs = np.array([y_errs, y_errs])
+    elif not y_errs.shape[0] == 2:
+        y_errs = y_errs.T  # try transposing
+    if not y_errs.shape[1] == nbins:
+        raise Exception("There are less y errors than points.")
+    x_steps = np.repeat(edges, 2)[1:-1]
+    y_down = np.repeat(y_coords - y_errs[0], 2)
+    y_up = np.repeat(y_coords + y_errs[1], 2)
+    return x_steps, y_down, y_up
+
+def envelope_vertices(x_steps, y_down, y_up):
+    """Returns the vertices of the polygon enclosing the area between the
+    lower and the upper steps."""
+    return np.concatenate([np.column_stack([x_steps, y_up]),
+                           np.column_stack([x_steps[::-1], y_down[::-1]])])
 
 def data_object_names(filename):
     """Retrieves all data object names from a YODA file."""
-    data_objects = yoda.readYODA(filename)
-    return [key for key in data_objects.keys()
-            if not data_objects[key].type in ('Counter', 'Scatter1D')]
+    return [name for name, type_name in loader.object_types(filename).items()
+            if not type_name in ('Counter', 'Scatter1D')]
+
+def histogram_names(filename, skips_auxiliary=True):
+    """Retrieves the names of the Histo1D and Scatter2D data objects from a
+    YODA file, i.e. those that can be plotted and combined. Unless
+    skips_auxiliary is False, auxiliary data objects are skipped (see
+    is_auxiliary_rivet_path)."""
+    return [name for name, type_name in loader.object_types(filename).items()
+            if type_name in ('Histo1D', 'Scatter2D')
+            and not (skips_auxiliary and is_auxiliary_rivet_path(name))]
+
+def is_auxiliary_rivet_path(rivet_path):
+    """Returns whether a data object holds reference data (below /REF/),
+    unscaled data (below /RAW/) or internal Rivet data (names starting with
+    an underscore)."""
+    return (rivet_path.startswith(('/REF/', '/RAW/'))
+            or rivet_path.split('/')[-1].startswith('_'))
 
 def resolve_data_object(filename_or_data_object, name,
         divide_by=None,
@@ -231,133 +281,139 @@ def resolve_data_object(filename_or_data_object, name,
         deviate_from=None,
         assume_correlated=False,
         rebin_count=1,
-        rebin_begin=0):
+        rebin_begin=0,
+        as_histogram=False):
     """Take passed data object or loads a data object from a YODA file,
-    and return it after dividing (or multiplying) by divide_by (multiply_by)."""
-    if isinstance(filename_or_data_object, str):
-        data_object = yoda.readYODA(filename_or_data_object)[name]
+    and return it after dividing (or multiplying) by divide_by (multiply_by).
+
+    The result is a YODA data object, or a
+    :py:class:`heppyplotlib.histogram.Histogram` if as_histogram is True or
+    YODA is not installed. YODA data objects are copied and rebinned with
+    YODA, such that a Histo1D keeps all its statistics, and the results of the
+    arithmetic are Scatter2D objects."""
+    uses_yoda = not as_histogram and has_yoda()
+    if uses_yoda:
+        data_object = load_yoda_data_object(filename_or_data_object, name,
+                                            rebin_count, rebin_begin)
+        if divide_by is None and multiply_by is None and subtract_by is None \
+                and deviate_from is None:
+            return data_object
+    histogram = resolve_data_objects([filename_or_data_object], name,
+                                divide_by=divide_by,
+                                multiply_by=multiply_by,
+                                subtract_by=subtract_by,
+                                deviate_from=deviate_from,
+                                assume_correlated=[assume_correlated],
+                                rebin_count=rebin_count,
+                                rebin_begin=rebin_begin)[0]
+    if not uses_yoda:
+        return histogram
+    import yoda
+    scatter = yoda.mkScatter(data_object)
+    for point, y, y_errs in zip(scatter.points(), histogram.y, histogram.y_errs.T):
+        point.setY(y)
+        point.setYErrs(list(y_errs))
+    return scatter
+
+@instrumentation.instrumented('resolve')
+def resolve_data_objects(files_or_data_objects, name,
+        divide_by=None,
+        multiply_by=None,
+        subtract_by=None,
+        deviate_from=None,
+        assume_correlated=False,
+        rebin_count=1,
+        rebin_begin=0):
+    """Like resolve_data_object, but for a list of files or data objects, and
+    always return :py:class:`heppyplotlib.histogram.Histogram` objects.
+
+    The operands are resolved only once, and data objects with the same number
+    of bins are processed together as a (data objects x bins) stack.
+    assume_correlated can also be a list with one entry per data object."""
+    histograms = [load_histogram(filename_or_data_object, name, rebin_count, rebin_begin)
+                  for filename_or_data_object in files_or_data_objects]
+    if divide_by is None and multiply_by is None and subtract_by is None and deviate_from is None:
+        return histograms
+    if isinstance(assume_correlated, (list, tuple, np.ndarray)):
+        assume_correlated = np.array([bool(value) for value in assume_correlated])
     else:
-        data_object = filename_or_data_object.clone()
-    if not rebin_count == 1:
-        if data_object.type == "Histo1D":
-            data_object.rebin(rebin_count, begin=rebin_begin)
-        else:
-            print("WARNING: Will assume statistical errors for rebinning a scatter plot")
-            x_coords = [point.x() for point in data_object.points()]
-            y_coords = get_scatter2d_y_coords(data_object)
-            x_errs = []
-            x_errs.append([point.xErrs()[0] for point in data_object.points()])
-            x_errs.append([point.xErrs()[1] for point in data_object.points()])
-            if not are_points_with_errors_adjacent(x_coords, x_errs):
-                raise Exception("Points must be adjacent for interpreting the scatter plots as a histogram")
-            new_points = data_object.points()[0:rebin_begin]
-            i = 0
-            while rebin_begin + i * rebin_count < len(data_object.points()) - 1:
-                first_index = rebin_begin + i * rebin_count
-                last_index = min(first_index + rebin_count, len(data_object.points()))
-                points = data_object.points()[first_index:last_index]
-                left_edge = points[0].x() - points[0].xErrs()[0]
-                right_edge = points[-1].x() + points[-1].xErrs()[1]
-                length = right_edge - left_edge
-                new_x = left_edge + length / 2.0
-                new_xerrs = length / 2.0
-                new_y = 0.0
-                new_yerrs = np.array([0.0, 0.0])
-                for point in points:
-                    left_edge = point.x() - point.xErrs()[0]
-                    right_edge = point.x() + point.xErrs()[1]
-                    new_y += (right_edge - left_edge) * point.y()
-                    new_yerrs += ((right_edge - left_edge) * np.array(point.yErrs()))**2
-                new_y /= length
-                new_yerrs = np.sqrt(new_yerrs) / length
-                new_points.append(yoda.Point2D(x=new_x, y=new_y, xerrs=new_xerrs, yerrs=new_yerrs))
-                i = i + 1
-            data_object = yoda.Scatter2D(path=data_object.path, title=data_object.title)
-            for point in new_points:
-                data_object.addPoint(point)
-    if subtract_by is not None:
-        data_object = yoda.mkScatter(data_object)
-        operand = resolve_data_object(subtract_by, name).mkScatter()
-        for point, operand_point in zip(data_object.points(), operand.points()):
-            new_y = point.y() - operand_point.y()
-            if assume_correlated:
-                new_y_errs = [y_err - operand_point.y() for y_err in point.yErrs()]
-            if not assume_correlated:
-                # assume that we subtract an independent data set, use error propagation
-                new_y_errs = []
-                for y_err, operand_y_err in zip(point.yErrs(), operand_point.yErrs()):
-                    err2 = 0.0
-                    if point.y() != 0.0:
-                        err2 += (y_err)**2
-                    err2 += (operand_y_err)**2
-                    new_y_errs.append(np.sqrt(err2))
-            point.setY(new_y)
-            point.setYErrs(new_y_errs)
-    if divide_by is not None or multiply_by is not None:
-        data_object = yoda.mkScatter(data_object)
-        if isinstance(divide_by, float) or isinstance(multiply_by, float):
-            for point in data_object.points():
+        assume_correlated = np.array([bool(assume_correlated)] * len(histograms))
+    if deviate_from is not None and np.any(assume_correlated):
+        raise Exception("You can not use assume_correlated and deviate_from at the same time.")
+    operands = {}
+    for key, operand in (('subtract_by', subtract_by), ('deviate_from', deviate_from),
+                         ('divide_by', divide_by), ('multiply_by', multiply_by)):
+        if operand is not None and not isinstance(operand, float):
+            operands[key] = load_histogram(operand, name, rebin_count, rebin_begin)
+    results = [None] * len(histograms)
+    # stack data objects with the same number of bins
+    groups = {}
+    for i, histogram in enumerate(histograms):
+        groups.setdefault(len(histogram), []).append(i)
+    for indices in groups.values():
+        y = np.array([histograms[i].y for i in indices])
+        y_errs = np.array([histograms[i].y_errs for i in indices])
+        correlated = assume_correlated[indices]
+        if subtract_by is not None:
+            operand = operands['subtract_by']
+            y, y_errs = arithmetic.subtract(y, y_errs, operand.y, operand.y_errs, correlated)
+        if divide_by is not None or multiply_by is not None:
+            if isinstance(divide_by, float) or isinstance(multiply_by, float):
                 if divide_by is not None:
-                    new_y = point.y() / divide_by
-                    new_y_errs = [y_err / divide_by for y_err in point.yErrs()]
+                    y, y_errs = arithmetic.scale(y, y_errs, 1.0 / divide_by)
                 else:
-                    new_y = point.y() * multiply_by
-                    new_y_errs = [y_err * multiply_by for y_err in point.yErrs()]
-                point.setY(new_y)
-                point.setYErrs(new_y_errs)
-        else:
-            if divide_by is not None:
-                operand = resolve_data_object(divide_by, name).mkScatter()
+                    y, y_errs = arithmetic.scale(y, y_errs, multiply_by)
+            elif divide_by is not None:
+                operand = operands['divide_by']
+                y, y_errs = arithmetic.divide(y, y_errs, operand.y, operand.y_errs, correlated)
             else:
-                operand = resolve_data_object(multiply_by, name).mkScatter()
-            for point, operand_point in zip(data_object.points(), operand.points()):
-                if operand_point.y() == 0.0:
-                    if divide_by is not None:
-                        new_y = 1.0
-                    else:
-                        new_y = 0.0
-                    new_y_errs = [0.0, 0.0]
-                else:
-                    if divide_by is not None:
-                        new_y = point.y() / operand_point.y()
-                        if assume_correlated:
-                            new_y_errs = [y_err / operand_point.y() for y_err in point.yErrs()]
-                    else:
-                        new_y = point.y() * operand_point.y()
-                        if assume_correlated:
-                            new_y_errs = [y_err * operand_point.y() for y_err in point.yErrs()]
-                    if not assume_correlated:
-                        # assume that we divide/multiply through an independent data set, use error propagation
-                        rel_y_errs = []
-                        for y_err, operand_y_err in zip(point.yErrs(), operand_point.yErrs()):
-                            err2 = 0.0
-                            if point.y() != 0.0:
-                                err2 += (y_err / point.y())**2
-                            err2 += (operand_y_err / operand_point.y())**2
-                            rel_y_errs.append(np.sqrt(err2))
-                        new_y_errs = [rel_y_err * new_y for rel_y_err in rel_y_errs]
-                point.setY(new_y)
-                point.setYErrs(new_y_errs)
-    if deviate_from is not None:
-        if assume_correlated:
-            raise Exception("You can not use assume_correlated and deviate_from at the same time.")
-        data_object = yoda.mkScatter(data_object)
-        operand = resolve_data_object(deviate_from, name).mkScatter()
-        is_equal = True
-        for point, operand_point in zip(data_object.points(), operand.points()):
-            new_y = point.y() - operand_point.y()
-            if new_y != 0.0:
-                is_equal = False
-            new_y_errs = []
-            for y_err, operand_y_err in zip(point.yErrs(), operand_point.yErrs()):
-                err2 = 0.0
-                err2 += (y_err)**2
-                err2 += (operand_y_err)**2
-                new_y_errs.append(np.sqrt(err2))
-            new_y /= new_y_errs[0]
-            point.setY(new_y)
-            point.setYErrs(0)
-        if is_equal:
-            for point in data_object.points():
-                point.setYErrs(1)
+                operand = operands['multiply_by']
+                y, y_errs = arithmetic.multiply(y, y_errs, operand.y, operand.y_errs, correlated)
+        if deviate_from is not None:
+            operand = operands['deviate_from']
+            y, y_errs = arithmetic.deviate(y, y_errs, operand.y, operand.y_errs)
+        for i, new_y, new_y_errs in zip(indices, y, y_errs):
+            result = histograms[i].to_scatter()
+            result.y = new_y
+            result.y_errs = new_y_errs
+            results[i] = result
+    return results
+
+def load_yoda_data_object(filename_or_data_object, name, rebin_count=1, rebin_begin=0):
+    """Take passed data object or loads a data object from a YODA file, and
+    return a (rebinned) copy of it as a YODA data object."""
+    if isinstance(filename_or_data_object, str):
+        data_object = loader.load_data_object(filename_or_data_object, name)
+    else:
+        data_object = filename_or_data_object
+    if isinstance(data_object, Histogram) or (not rebin_count == 1
+                                              and not data_object.type == "Histo1D"):
+        # the NumPy parser does not create YODA objects, and YODA can not
+        # rebin scatter plots
+        return load_histogram(data_object, name, rebin_count, rebin_begin).to_yoda()
+    data_object = data_object.clone()
+    if not rebin_count == 1:
+        with instrumentation.timed('rebin'):
+            data_object.rebin(rebin_count, begin=rebin_begin)
     return data_object
+
+def load_histogram(filename_or_data_object, name, rebin_count=1, rebin_begin=0):
+    """Take passed data object or loads a data object from a YODA file, and
+    return it as a (rebinned) :py:class:`heppyplotlib.histogram.Histogram`."""
+    if isinstance(filename_or_data_object, str):
+        histogram = loader.load_histogram(filename_or_data_object, name)
+    else:
+        histogram = Histogram.from_yoda(filename_or_data_object)
+    if rebin_count == 1:
+        if histogram is filename_or_data_object or isinstance(filename_or_data_object, str):
+            # do not hand out data objects that are shared with the caller or the cache
+            histogram = histogram.clone()
+        return histogram
+    if not histogram.type == "Histo1D":
+        _logger.warning("Will assume statistical errors for rebinning the scatter plot %s", name)
+        if not are_points_with_errors_adjacent(histogram.x, histogram.x_errs):
+            raise Exception("Points must be adjacent for interpreting the scatter plots as a histogram")
+    with instrumentation.timed('rebin'):
+        bin_map = rebinning.cached_rebin_map(histogram.x_lows, histogram.x_highs,
+                                             rebin_count, rebin_begin)
+        return rebinning.rebin(bin_map, histogram)
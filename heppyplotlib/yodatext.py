@@ -0,0 +1,132 @@
+"""Parse the YODA text format directly into NumPy arrays, without the YODA
+bindings.
+
+Histo1D and Scatter2D objects are returned as
+:py:class:`heppyplotlib.histogram.Histogram` objects and Counter objects as
+:py:class:`Counter` objects. The numeric part of each block is converted in a
+single call, instead of creating Python objects for each bin. The formats
+written by YODA 1 (with and without the _V2 suffix) and by YODA 2 (_V3) are
+supported. The loader uses this parser if YODA is not installed, or if it is
+requested using :py:func:`heppyplotlib.loader.set_parser`."""
+
+from collections import OrderedDict
+import re
+
+import numpy as np
+
+from . import yodaindex
+from .histogram import Histogram
+
+SUPPORTED_TYPES = ('Counter', 'Histo1D', 'Scatter2D')
+
+_ANNOTATION = re.compile(r'^([A-Za-z][\w()]*)[ \t]*[:=][ \t]?(.*)$')
+_EDGES = re.compile(r'^Edges\(A1\):[ \t]*\[(.*)\]', re.MULTILINE)
+
+
+class Counter(object):
+    """A YODA Counter, with the accessors of the YODA bindings."""
+
+    def __init__(self, sumw, sumw2, num_entries, path='', title=''):
+        self.sumw = sumw
+        self.sumw2 = sumw2
+        self.num_entries = num_entries
+        self.path = path
+        self.title = title
+        self.type = 'Counter'
+
+    def sumW(self):
+        return self.sumw
+
+    def sumW2(self):
+        return self.sumw2
+
+    def numEntries(self):
+        return self.num_entries
+
+
+def read(filename, skips_unsupported=True):
+    """Return an OrderedDict of the data objects within a YODA file, which can
+    be compressed."""
+    with yodaindex.open_yoda(filename) as yoda_file:
+        return parse(yoda_file.read().decode('utf-8'), skips_unsupported)
+
+
+def parse(text, skips_unsupported=False):
+    """Return an OrderedDict of the data objects within YODA text.
+
+    Data objects of other types than Counter, Histo1D and Scatter2D are
+    skipped, or an exception is raised unless skips_unsupported is True."""
+    data_objects = OrderedDict()
+    position = 0
+    while True:
+        # plain searches are much faster than a regular expression for the blocks
+        begin = text.find('BEGIN YODA_', position)
+        if begin == -1:
+            return data_objects
+        header_end = text.find('\n', begin)
+        end = text.find('END YODA_', header_end)
+        if header_end == -1 or end == -1:
+            raise Exception("The YODA block at offset {} is incomplete.".format(begin))
+        position = end
+        block_type, name = text[begin + len('BEGIN YODA_'):header_end].split()[:2]
+        type_name = yodaindex.type_name(block_type)
+        if type_name not in SUPPORTED_TYPES:
+            if skips_unsupported:
+                continue
+            raise Exception("{} is a {}, which can only be read using YODA.".format(
+                name, type_name))
+        # the END marker might be commented out like the BEGIN marker
+        body = text[header_end + 1:text.rfind('\n', header_end, end) + 1]
+        data_objects[name] = parse_block(type_name, name, body)
+
+
+def parse_block(type_name, name, body):
+    """Return the data object for the body of a BEGIN/END block."""
+    data_begin = _data_begin(body)
+    annotations = _annotations(body[:data_begin])
+    path = annotations.get('Path', name)
+    title = annotations.get('Title', '')
+    values = np.array(body[data_begin:].split(), dtype=np.float64)
+    if type_name == 'Scatter2D':
+        columns = values.reshape(-1, 6).T
+        return Histogram(columns[0], columns[1:3], columns[3], columns[4:6],
+                         path=path, title=title)
+    edges = _EDGES.search(body, 0, data_begin)
+    if type_name == 'Histo1D':
+        if edges is None:
+            columns = values.reshape(-1, 7).T
+            return Histogram.from_bins(columns[0], columns[1], columns[2], columns[3],
+                                       path=path, title=title)
+        # YODA 2 writes the underflow and the overflow as the first and last rows
+        edges = np.array(edges.group(1).replace(',', ' ').split(), dtype=np.float64)
+        columns = values.reshape(-1, 5)[1:-1].T
+        return Histogram.from_bins(edges[:-1], edges[1:], columns[0], columns[1],
+                                   path=path, title=title)
+    return Counter(values[0], values[1], values[2], path=path, title=title)
+
+
+def _data_begin(body):
+    # the numbers follow the last comment line, which names their columns, or
+    # the separator of the annotations
+    marker = max(body.rfind('\n#'), body.rfind('\n---'))
+    if marker != -1:
+        return body.find('\n', marker + 1) + 1
+    if body.startswith(('#', '---')):
+        return body.find('\n') + 1
+    offset = 0
+    for line in body.splitlines(True):
+        if _ANNOTATION.match(line) is None:
+            break
+        offset += len(line)
+    return offset
+
+
+def _annotations(header):
+    annotations = {}
+    for line in header.splitlines():
+        if line.startswith('---') or line.startswith('#'):
+            break
+        match = _ANNOTATION.match(line)
+        if match is not None:
+            annotations[match.group(1)] = match.group(2).strip()
+    return annotations
@@ -49,7 +49,7 @@ setup(
 
     keywords='plot hep high energy physics cross section histogram bin binned data',
 
-    packages=find_packages(exclude=['contrib', 'docs', 'tests*']),
+    packages=find_packages(exclude=['benchmarks', 'contrib', 'docs', 'tests*']),
 
     install_requires = ['matplotlib', 'numpy', 'pyaml'],
 
@@ -59,6 +59,8 @@ setup(
         },
 
     entry_points = {
-            'console_scripts': ['hpl-plot=heppyplotlib.command_line:plot']
+            'console_scripts': ['hpl-plot=heppyplotlib.command_line:plot',
+                                'hpl-render=heppyplotlib.command_line:render',
+                                'hpl-pack=heppyplotlib.command_line:pack']
         }
 )